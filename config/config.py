@@ -6,7 +6,176 @@ class Config:
         self.GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
         self.EDENAI_API_KEY = os.getenv('EDENAI_API_KEY')
         self.ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
+
+        # Thread pool size for each CPU-bound analyzer
+        self.YOLO_POOL_SIZE = int(os.getenv('YOLO_POOL_SIZE', 2))
+        self.FACE_POOL_SIZE = int(os.getenv('FACE_POOL_SIZE', 2))
+        self.QR_POOL_SIZE = int(os.getenv('QR_POOL_SIZE', 2))
+        self.METADATA_POOL_SIZE = int(os.getenv('METADATA_POOL_SIZE', 1))
+        self.ENCODE_POOL_SIZE = int(os.getenv('ENCODE_POOL_SIZE', 2))
+
+        # Inference tier: "thread" runs YOLO and face detection in this process, "process" uses a worker pool
+        self.INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'thread')
+        self.INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 2))
+        self.INFERENCE_THREADS_PER_WORKER = int(os.getenv('INFERENCE_THREADS_PER_WORKER', 1))
+
+        # YOLO micro-batching across concurrent requests (batch size 1 disables it)
+        self.YOLO_BATCH_SIZE = int(os.getenv('YOLO_BATCH_SIZE', 1))
+        self.YOLO_BATCH_WAIT_MS = float(os.getenv('YOLO_BATCH_WAIT_MS', 5))
+
+        # Face detection micro-batching across concurrent requests (batch size 1 disables it)
+        self.FACE_BATCH_SIZE = int(os.getenv('FACE_BATCH_SIZE', 1))
+        self.FACE_BATCH_WAIT_MS = float(os.getenv('FACE_BATCH_WAIT_MS', 5))
+
+        # Content-addressed result cache: in-memory LRU plus an optional on-disk tier
+        self.RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+        self.RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        self.RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR')
+        self.CACHE_POOL_SIZE = int(os.getenv('CACHE_POOL_SIZE', 2))
+
+        # Near-duplicate reuse: perceptual hash ("phash" or "dhash") and max Hamming distance for a match
+        self.PHASH_ENABLED = os.getenv('PHASH_ENABLED', 'true').lower() == 'true'
+        self.PHASH_ALGORITHM = os.getenv('PHASH_ALGORITHM', 'phash')
+        self.PHASH_MAX_DISTANCE = int(os.getenv('PHASH_MAX_DISTANCE', 6))
+        self.PHASH_MAX_ENTRIES = int(os.getenv('PHASH_MAX_ENTRIES', 50000))
+
+        # Upload limits; bodies above INGEST_SPOOL_BYTES are spooled to a memory-mapped temp file
+        self.MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', 25 * 1024 * 1024))
+        self.MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', 60_000_000))
+        self.INGEST_SPOOL_BYTES = int(os.getenv('INGEST_SPOOL_BYTES', 1024 * 1024))
+        self.INGEST_HEADER_PROBE_BYTES = int(os.getenv('INGEST_HEADER_PROBE_BYTES', 256 * 1024))
+
+        # Longest side each consumer decodes at (0 = full resolution); boxes are mapped back to the original
+        self.YOLO_DECODE_MAX_SIDE = int(os.getenv('YOLO_DECODE_MAX_SIDE', 1280))
+        self.FACE_DECODE_MAX_SIDE = int(os.getenv('FACE_DECODE_MAX_SIDE', 1920))
+        self.LLM_DECODE_MAX_SIDE = int(os.getenv('LLM_DECODE_MAX_SIDE', 1568))
+        self.PHASH_DECODE_MAX_SIDE = int(os.getenv('PHASH_DECODE_MAX_SIDE', 256))
+
+        # Batch scanning: body size and entry limits, images analysed at once, archive unpacking threads
+        self.BATCH_MAX_BYTES = int(os.getenv('BATCH_MAX_BYTES', 1024 * 1024 * 1024))
+        self.BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', 10000))
+        self.BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8))
+        # YOLO/face detection batch size for the images of one /api/batch request (1 = per image)
+        self.BATCH_INFERENCE_SIZE = int(os.getenv('BATCH_INFERENCE_SIZE', 8))
+        self.ARCHIVE_POOL_SIZE = int(os.getenv('ARCHIVE_POOL_SIZE', 2))
+
+        # Background jobs: broker ("memory", "sqlite" or "redis"), its location, workers per process
+        self.JOB_BROKER = os.getenv('JOB_BROKER', 'memory')
+        self.JOB_BROKER_URL = os.getenv('JOB_BROKER_URL', 'jobs.sqlite3')
+        self.JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+        self.JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 24 * 3600))
+        self.JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 0.5))
+        self.JOB_WEBHOOK_SECRET = os.getenv('JOB_WEBHOOK_SECRET')
+        self.JOB_WEBHOOK_RETRIES = int(os.getenv('JOB_WEBHOOK_RETRIES', 3))
+        # Hosts callback_url may point at; empty allows any host that resolves to public addresses only
+        self.JOB_WEBHOOK_ALLOWED_HOSTS = [host.strip().lower() for host in
+                                          os.getenv('JOB_WEBHOOK_ALLOWED_HOSTS', '').split(',') if host.strip()]
+        self.JOBS_POOL_SIZE = int(os.getenv('JOBS_POOL_SIZE', 2))
+        self.SANDBOX_POOL_SIZE = int(os.getenv('SANDBOX_POOL_SIZE', 1))
+
+        # Admission control: requests running at once and waiting per endpoint group, max wait (seconds)
+        self.API_MAX_ACTIVE = int(os.getenv('API_MAX_ACTIVE', 16))
+        self.API_MAX_QUEUE = int(os.getenv('API_MAX_QUEUE', 64))
+        self.EXTENSION_MAX_ACTIVE = int(os.getenv('EXTENSION_MAX_ACTIVE', 32))
+        self.EXTENSION_MAX_QUEUE = int(os.getenv('EXTENSION_MAX_QUEUE', 128))
+        # /api/batch runs up to BATCH_CONCURRENCY analyses per request, so it gets far fewer slots
+        self.BATCH_MAX_ACTIVE = int(os.getenv('BATCH_MAX_ACTIVE', 2))
+        self.BATCH_MAX_QUEUE = int(os.getenv('BATCH_MAX_QUEUE', 8))
+        self.ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 10))
+
+        # Per-analyzer concurrency caps; the external APIs can also be rate limited (requests/second, 0 = off)
+        self.OBJECTS_MAX_CONCURRENCY = int(os.getenv('OBJECTS_MAX_CONCURRENCY', 8))
+        self.FACES_MAX_CONCURRENCY = int(os.getenv('FACES_MAX_CONCURRENCY', 8))
+        self.QR_MAX_CONCURRENCY = int(os.getenv('QR_MAX_CONCURRENCY', 8))
+        self.METADATA_MAX_CONCURRENCY = int(os.getenv('METADATA_MAX_CONCURRENCY', 16))
+        self.NSFW_MAX_CONCURRENCY = int(os.getenv('NSFW_MAX_CONCURRENCY', 4))
+        self.NSFW_RATE_LIMIT = float(os.getenv('NSFW_RATE_LIMIT', 0))
+        self.LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 4))
+        self.LLM_RATE_LIMIT = float(os.getenv('LLM_RATE_LIMIT', 0))
+
+        # Run face detection only inside the object detector's person boxes (needs a model with such a class)
+        self.FACES_ON_PERSONS = os.getenv('FACES_ON_PERSONS', 'false').lower() == 'true'
+        self.FACE_REGION_LABELS = [label.strip() for label in os.getenv('FACE_REGION_LABELS', 'Person,person').split(',')]
+
+        # Per-analyzer deadlines and the total budget for one request (seconds, 0 = no limit)
+        self.OBJECTS_DEADLINE = float(os.getenv('OBJECTS_DEADLINE', 10))
+        self.FACES_DEADLINE = float(os.getenv('FACES_DEADLINE', 10))
+        self.QR_DEADLINE = float(os.getenv('QR_DEADLINE', 8))
+        self.METADATA_DEADLINE = float(os.getenv('METADATA_DEADLINE', 5))
+        self.NSFW_DEADLINE = float(os.getenv('NSFW_DEADLINE', 10))
+        self.LLM_DEADLINE = float(os.getenv('LLM_DEADLINE', 25))
+        self.REQUEST_BUDGET = float(os.getenv('REQUEST_BUDGET', 30))
+
+        # Startup warm-up: dummy inferences on WARMUP_IMAGE and pre-opened connections to WARMUP_URLS
+        self.WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'
+        self.WARMUP_BLOCKING = os.getenv('WARMUP_BLOCKING', 'false').lower() == 'true'
+        self.WARMUP_IMAGE = os.getenv('WARMUP_IMAGE', 'utils/faceDetect/images/group1.jpg')
+        self.WARMUP_URLS = [url for url in os.getenv('WARMUP_URLS', 'https://api.edenai.run').split(',') if url]
+
+        # Analyzers this process serves and ever loads: full, extension, light or a comma-separated list
+        self.WORKER_ROLE = os.getenv('WORKER_ROLE', 'full')
+
+        # Pre-fork serving (python -m utils.pipeline.prefork): models load once in the parent and the
+        # workers share their pages copy-on-write. TensorFlow is not fork-safe, so MTCNN ("faces")
+        # is only preloaded when listed here explicitly.
+        self.PREFORK_WORKERS = int(os.getenv('PREFORK_WORKERS', 2))
+        self.PREFORK_PRELOAD = [name for name in os.getenv('PREFORK_PRELOAD', 'objects').split(',') if name]
+        # torch threads per worker (0 = torch's default)
+        self.PREFORK_THREADS_PER_WORKER = int(os.getenv('PREFORK_THREADS_PER_WORKER', 0))
+        # Seconds between per-worker USS/PSS log lines from the parent (0 = off)
+        self.PREFORK_MEMORY_LOG_INTERVAL = float(os.getenv('PREFORK_MEMORY_LOG_INTERVAL', 300))
+
+        # YOLO weights: best.pt (PyTorch) or an export from utils.ObjectModel.export, such as
+        # best.onnx (ONNX Runtime) or best_openvino_model/ (OpenVINO); the format follows the path
+        self.YOLO_WEIGHTS = os.getenv('YOLO_WEIGHTS', 'utils/ObjectModel/best.pt')
+
+        # Tiled YOLO for small objects: images whose longer side is at least YOLO_TILE_MIN_SIDE (0 = off)
+        # are scanned at full resolution in overlapping tiles, YOLO_TILE_BATCH tiles per predict call,
+        # plus one whole-frame pass; duplicates across tiles are merged at YOLO_TILE_NMS_IOU
+        self.YOLO_TILE_MIN_SIDE = int(os.getenv('YOLO_TILE_MIN_SIDE', 0))
+        self.YOLO_TILE_SIZE = int(os.getenv('YOLO_TILE_SIZE', 1024))
+        self.YOLO_TILE_OVERLAP = float(os.getenv('YOLO_TILE_OVERLAP', 0.2))
+        self.YOLO_TILE_BATCH = int(os.getenv('YOLO_TILE_BATCH', 8))
+        self.YOLO_TILE_NMS_IOU = float(os.getenv('YOLO_TILE_NMS_IOU', 0.5))
+
+        # Video analysis (/video): upload and duration caps, frames sampled per second, the share of pixels
+        # that must differ from the last keyframe for a sampled frame to become a keyframe, the longest
+        # gap between keyframes (seconds), keyframes analysed at most, and IoU that links boxes into tracks
+        self.VIDEO_MAX_BYTES = int(os.getenv('VIDEO_MAX_BYTES', 200 * 1024 * 1024))
+        self.VIDEO_MAX_SECONDS = float(os.getenv('VIDEO_MAX_SECONDS', 120))
+        self.VIDEO_SAMPLE_FPS = float(os.getenv('VIDEO_SAMPLE_FPS', 2))
+        self.VIDEO_CHANGE_THRESHOLD = float(os.getenv('VIDEO_CHANGE_THRESHOLD', 0.02))
+        self.VIDEO_MAX_KEYFRAME_GAP = float(os.getenv('VIDEO_MAX_KEYFRAME_GAP', 10))
+        self.VIDEO_MAX_KEYFRAMES = int(os.getenv('VIDEO_MAX_KEYFRAMES', 60))
+        self.VIDEO_TRACK_IOU = float(os.getenv('VIDEO_TRACK_IOU', 0.3))
+        self.VIDEO_POOL_SIZE = int(os.getenv('VIDEO_POOL_SIZE', 2))
+
+        # Face detector: "mtcnn" (TensorFlow), "yunet" (OpenCV FaceDetectorYN) or "ssd" (OpenCV DNN
+        # ResNet-10). The OpenCV models are not bundled: face_detection_yunet_2023mar.onnx from the
+        # OpenCV model zoo and res10_300x300_ssd_iter_140000.caffemodel. FACE_MIN_SCORE is the score
+        # the OpenCV detectors report down to; the request's thresholds filter further.
+        self.FACE_BACKEND = os.getenv('FACE_BACKEND', 'mtcnn')
+        self.FACE_YUNET_MODEL = os.getenv('FACE_YUNET_MODEL', 'utils/faceDetect/models/face_detection_yunet_2023mar.onnx')
+        self.FACE_SSD_CONFIG = os.getenv('FACE_SSD_CONFIG', 'utils/faceDetect/models/deploy.prototxt')
+        self.FACE_SSD_MODEL = os.getenv('FACE_SSD_MODEL', 'utils/faceDetect/models/res10_300x300_ssd_iter_140000.caffemodel')
+        self.FACE_MIN_SCORE = float(os.getenv('FACE_MIN_SCORE', 0.5))
+
+        # Annotated overlay (/annotate): longest side it is drawn at and the JPEG/WebP quality
+        self.ANNOTATE_MAX_SIDE = int(os.getenv('ANNOTATE_MAX_SIDE', 1280))
+        self.ANNOTATE_QUALITY = int(os.getenv('ANNOTATE_QUALITY', 80))
+
+        # Privacy redaction (/redact): labels whose boxes are obscured ("Face" for the faces analyzer),
+        # default mode (blur or pixelate), padding added around each box and the JPEG/WebP quality
+        self.REDACT_LABELS = [label for label in os.getenv(
+            'REDACT_LABELS', 'Face,Id Card,Credit Card,Car Plate Number,House Number Plate').split(',') if label]
+        self.REDACT_MODE = os.getenv('REDACT_MODE', 'blur')
+        self.REDACT_PADDING = float(os.getenv('REDACT_PADDING', 0.1))
+        self.REDACT_QUALITY = int(os.getenv('REDACT_QUALITY', 90))
+
+        # Timeout (seconds) for outbound HTTP calls made with the async clients
+        self.HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 30))
+        # How long idle pooled connections are kept open, so warmed connections outlive the warm-up
+        self.HTTP_KEEPALIVE = float(os.getenv('HTTP_KEEPALIVE', 60))
         
   
 config = Config()
-
@@ -1,10 +1,12 @@
-from fastapi import FastAPI, File, UploadFile
+from fastapi import Depends, FastAPI, File, UploadFile, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from PIL import Image
 import io
+import json
 import asyncio
 import os
-#import OpenAI 
-import openai 
+from contextlib import asynccontextmanager
+from typing import Optional
 
 
 from utils.ObjectModel import detect
@@ -13,15 +15,55 @@ from utils.metadata import read_data
 from utils.qr_code import qr_checker
 from utils.nsfw import nsfw_detect
 from utils.genai_llm import llm_response
+from utils.pipeline import admission, analyzers, batching, executor, inference_pool
+from utils.pipeline import annotate, batch, ingest, redact, warmup
+from utils.pipeline.image_context import ImageContext
+from utils.pipeline.ingest import IngestedUpload
+from utils.jobs import worker as jobs
+from utils.qr_code import sandbox
+from utils.video import video_analysis
+from utils.cache.phash import near_duplicates
+from utils.cache.result_cache import result_cache
 from config import config
 from fastapi.middleware.cors import CORSMiddleware
 
-#import Key 
-openai.api_key = os.getenv("OPENAI_API_KEY")
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    jobs.start()
+    # Warm up in the background: / answers at once for liveness while /ready reports 503 until warm
+    warming = asyncio.ensure_future(warmup.warm_up())
+    if config.WARMUP_BLOCKING:
+        await warming
+
+    yield
+
+    # Drop out of the load balancer first, then drain
+    warmup.status["ready"] = False
+    warming.cancel()
+    await jobs.stop()
+    await detect.close_batchers()
+    await face_detection.close_batchers()
+    await executor.shutdown()
+    inference_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 		
 		
+# Bounded admission queues in front of the analysis endpoints; added before CORS so 503s keep CORS headers
+app.add_middleware(admission.AdmissionMiddleware, routes={
+    "/api": admission.controllers["api"],
+    "/api/stream": admission.controllers["api"],
+    "/api/batch": admission.controllers["batch"],
+    "/process_qr_with_gpt": admission.controllers["api"],
+    "/annotate": admission.controllers["api"],
+    "/redact": admission.controllers["api"],
+    "/video": admission.controllers["api"],
+    "/extension": admission.controllers["extension"],
+})
+
 # CORS configuration
 origins = [
     "http://localhost:3000",      
@@ -78,14 +120,14 @@ def check_nsfw_from_llm(llm_result: dict) -> bool:
 
 #Add the LLM API Route
 
-# Load OpenAI API key (store in an env variable or config)
-openai.api_key = "your_openai_api_key_here"
-
 @app.post("/llm")
 async def llm_endpoint(prompt: str):
 
 #Sends user input to OpenAI's LLM (GPT-4) and returns the response.
 
+    # Imported on first use: the SDK is only needed by this endpoint
+    import openai
+    openai.api_key = os.getenv("OPENAI_API_KEY")
     try:
         response = openai.ChatCompletion.create(
             model="gpt-4",
@@ -96,84 +138,274 @@ async def llm_endpoint(prompt: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 		
-@app.post("/api")
-
-async def process_image(file: UploadFile = File(...)):
+# Analyzers behind /api and the response section each one fills
+API_ANALYZERS = ["objects", "qr", "metadata", "faces", "nsfw", "llm"]
+API_SECTIONS = {
+    "objects": "detected_objects",
+    "qr": "qr_details",
+    "metadata": "metadata_details",
+    "faces": "face_details",
+    # Raw provider result; the nsfw_detection verdict itself is derived from the LLM answer
+    "nsfw": "nsfw_details",
+    "llm": "llm_response",
+}
+
+
+def select_analyzers(default: list):
+    """
+    Dependency reading the ?analyzers=objects,qr or ?profile=fast|privacy|full selection of an endpoint.
+    """
+    def dependency(analyzers_param: Optional[str] = Query(None, alias="analyzers"), profile: Optional[str] = None):
+        try:
+            return analyzers.select(analyzers_param, profile, default)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return dependency
+
+
+def build_api_response(results: dict) -> dict:
+    """Merge the analyzer results into the /api response; sections that were not requested are left out."""
+    response = {}
+
+    if "objects" in results or "faces" in results:
+        detected_objects = results.get("objects")
+        face_details = results.get("faces")
+
+        if face_details and not analyzers.is_timed_out(face_details) and not analyzers.is_timed_out(detected_objects):
+            detected_objects = list(detected_objects or []) + [face_details]
+        elif face_details:
+            # Finished faces next to a timed-out objects section, or faces that timed out themselves:
+            # reported on their own rather than dropped
+            response["face_details"] = face_details
+        response["detected_objects"] = detected_objects
+
+    if "qr" in results:
+        response["qr_details"] = results["qr"]
+    if "metadata" in results:
+        response["metadata_details"] = results["metadata"]
+
+    if "llm" in results:
+        llm_result = results["llm"]
+        response["nsfw_detection"] = check_nsfw_from_llm(llm_result)
+        response["llm_response"] = llm_result
+
+    # Sections that missed their deadline carry {"timed_out": true}; list them for quick checks
+    timed_out = [name for name, result in results.items() if analyzers.is_timed_out(result)]
+    if timed_out:
+        response["timed_out"] = timed_out
+    return response
+
+
+@app.post("/api", openapi_extra=ingest.UPLOAD_OPENAPI)
+
+async def process_image(names: list = Depends(select_analyzers(API_ANALYZERS)),
+                        upload: IngestedUpload = Depends(ingest.stream_upload)):
     try:
-        # Read the uploaded image
-        image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes))
-
-        # Process tasks concurrently
-        tasks = [
-            detect.run_detection(image),
-            qr_checker.process_qr_scan(image),
-            read_data.extract_sensitive_metadata(image),
-            face_detection.process_image(image),
-            nsfw_detect.read_nsfw(image),
-            llm_response.llm_process(image)
-        ]
-        detected_objects, qr_details, metadata_details, face_details, _, llm_result = await asyncio.gather(*tasks)
-        
-        # nsfw_info
-        
+        # The upload was streamed, size-checked and hashed on arrival
+        image = upload.open_image()
+        digest = upload.digest
 
-        if face_details:
-            detected_objects = detected_objects or []
-            detected_objects.append(face_details)        
-       
-        nsfw_status = check_nsfw_from_llm(llm_result)
-
-        return {
-            "detected_objects": detected_objects,                               
-            "qr_details": qr_details,
-            "metadata_details": metadata_details,
-            "nsfw_detection" : nsfw_status,
-            "llm_response": llm_result
-        }
+        # Run the selected analyzers concurrently, reusing cached results for content we have already seen
+        results = await analyzers.run_analyzers(image, digest, names)
+        return build_api_response(results)
 
     except Exception as e:
         return {"error": str(e)}
     
-@app.post("/extension")
-async def process_image(file: UploadFile = File(...)):
-
-	try:
-        # Read image from uploaded file
-        image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes))
-
-        # Run object and QR detection concurrently
-        detection_result, qr_details = await asyncio.gather(
-            detect.run_detection(image),
-            qr_checker.process_qr_scan(image),
-        )
+@app.post("/api/stream", openapi_extra=ingest.UPLOAD_OPENAPI)
+async def stream_image(request: Request, names: list = Depends(select_analyzers(API_ANALYZERS)),
+                       upload: IngestedUpload = Depends(ingest.stream_upload), format: str = "ndjson"):
+    """
+    Same analysis as /api, but each section is sent as soon as its analyzer finishes, followed by
+    the merged /api response as the final "verdict" event. NDJSON by default; Server-Sent Events
+    with ?format=sse or an "Accept: text/event-stream" header.
+    """
+    use_sse = format == "sse" or "text/event-stream" in request.headers.get("accept", "")
+    image = upload.open_image()
+    digest = upload.digest
+
+    def encode(section: str, data) -> str:
+        if use_sse:
+            return f"event: {section}\ndata: {json.dumps(data, default=str)}\n\n"
+        return json.dumps({"section": section, "data": data}, default=str) + "\n"
+
+    async def events():
+        results = {}
+        try:
+            async for name, result in analyzers.iter_analyzers(image, digest, names):
+                # Sent before the merge below appends the faces to detected_objects
+                yield encode(API_SECTIONS[name], result)
+                results[name] = result
+            yield encode("verdict", build_api_response(results))
+        except Exception as e:
+            yield encode("error", {"error": str(e)})
+
+    if use_sse:
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/api/batch", openapi_extra=batch.BATCH_OPENAPI)
+async def process_batch(names: list = Depends(select_analyzers(API_ANALYZERS)),
+                        upload: batch.BatchUpload = Depends(batch.receive_batch)):
+    """
+    Scan many images in one request: a multipart list of files (archives allowed among them) or a
+    raw ZIP/TAR body. Returns one NDJSON line per image, in input order, as soon as it is ready.
+    """
+    async def scan(item: batch.BatchItem) -> dict:
+        entry = {"index": item.index, "filename": item.filename}
+        if item.error is not None:
+            entry["error"] = item.error
+            return entry
+        # Concurrent images of the batch share one YOLO and one face detection micro-batcher, so the
+        # models see them as batches even when batching is off for single-image requests
+        batching.route_batch_size.set(config.BATCH_INFERENCE_SIZE)
+        try:
+            results = await analyzers.run_analyzers(item.upload.open_image(), item.upload.digest, names)
+            entry["digest"] = item.upload.digest
+            entry.update(build_api_response(results))
+        except Exception as e:
+            entry["error"] = str(e)
+        return entry
+
+    async def lines():
+        try:
+            async for entry in batch.map_ordered(upload.items(), scan, config.BATCH_CONCURRENCY):
+                yield json.dumps(entry, default=str) + "\n"
+        except Exception as e:
+            # The status line is already sent; report what cut the batch short as the last line
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            yield json.dumps({"error": detail}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/annotate", openapi_extra=ingest.UPLOAD_OPENAPI)
+async def annotate_image(upload: IngestedUpload = Depends(ingest.stream_upload),
+                         format: str = Query("jpeg", pattern="^(jpeg|webp)$")):
+    """
+    The image with its object and face boxes drawn on, as JPEG or WebP. Detections cached by an
+    earlier /api call for the same image are reused; /api itself never renders anything.
+    """
+    names = ["objects", "faces"]
+    try:
+        analyzers.check_enabled(names)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    image = upload.open_image()
+    results = await analyzers.run_analyzers(image, upload.digest, names)
+    overlay = await executor.run_blocking("encode", annotate.render_overlay, image, results, format)
+    return Response(overlay, media_type=annotate.FORMATS[format][1])
+
+@app.post("/redact", openapi_extra=ingest.UPLOAD_OPENAPI)
+async def redact_image(upload: IngestedUpload = Depends(ingest.stream_upload),
+                       mode: str = Query(config.REDACT_MODE, pattern="^(blur|pixelate)$"),
+                       format: str = Query("jpeg", pattern="^(jpeg|webp)$")):
+    """
+    The image with its faces and sensitive objects (REDACT_LABELS) blurred or pixelated, as JPEG or
+    WebP without metadata. Detections cached by an earlier /api call for the same image are reused.
+    """
+    names = ["objects", "faces"]
+    try:
+        analyzers.check_enabled(names)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    image = upload.open_image()
+    # No deadlines and no near-duplicate reuse: the boxes must come from this image itself, since a
+    # region left unredacted is worse than waiting
+    results = await analyzers.run_analyzers(image, upload.digest, names, deadlines=False, near_duplicates=False)
+    redacted = await executor.run_blocking("encode", redact.redact, image, results, mode, format)
+    return Response(redacted, media_type=annotate.FORMATS[format][1])
+
+
+# Analyzers that make sense per video frame
+VIDEO_ANALYZERS = ["objects", "faces", "qr"]
+
+
+@app.post("/video", openapi_extra=ingest.UPLOAD_OPENAPI)
+async def process_video(names: list = Depends(select_analyzers(["objects", "faces"])),
+                        path: str = Depends(video_analysis.receive_video)):
+    """
+    Analyse a short clip (MP4/MOV, WebM/MKV or AVI). Only sampled frames that changed are analysed;
+    the response is a timeline of segments, each with the /api sections of its keyframe, and the
+    tracks that link a detected object or face across segments.
+    """
+    unsupported = [name for name in names if name not in VIDEO_ANALYZERS]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Not available for video: {', '.join(unsupported)}; "
+                                                    f"choose from {', '.join(VIDEO_ANALYZERS)}")
+    try:
+        timeline = await video_analysis.analyze_video(path, names)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        detected_objects = [val["object"] for val in detection_result]
-        vul = "Low"
+    for segment in timeline["segments"]:
+        segment.update(build_api_response(segment.pop("results")))
+    return timeline
 
-        moderate_items = ["Car Plate Number", "Knife"]
-        high_risk_items = ["Id Card", "Credit Card", "House Number Plate"]
 
-        if any(item in detected_objects for item in moderate_items):
-            vul = "Moderate"
-        if any(item in detected_objects for item in high_risk_items):
-            vul = "High"
-        if qr_details.get("is_malicious", False):
-            vul = "High"
+async def analysis_job(params: dict, data: bytes) -> dict:
+    # Jobs exist for slow analyses, so they run without the interactive deadlines
+    names = params.get("analyzers", API_ANALYZERS)
+    results = await analyzers.run_analyzers(ImageContext.from_bytes(data), params.get("digest"), names,
+                                            deadlines=False)
+    return build_api_response(results)
+
+
+async def qr_sandbox_job(params: dict, data: bytes) -> dict:
+    qr_data, error = await qr_checker.decode_qr(ImageContext.from_bytes(data))
+    if error:
+        return {"error": error}
+    return {"qr_data": qr_data, "sandbox": await sandbox.analyze(qr_data)}
+
+
+jobs.register("analyze", analysis_job)
+jobs.register("qr_sandbox", qr_sandbox_job)
 
-        return {"Vulnerable": vul}
 
+@app.post("/jobs", status_code=202, openapi_extra=ingest.UPLOAD_OPENAPI)
+async def submit_job(names: list = Depends(select_analyzers(API_ANALYZERS)),
+                     upload: IngestedUpload = Depends(ingest.stream_upload), kind: str = "analyze",
+                     callback_url: Optional[str] = None):
+    """
+    Queue an analysis and return at once. kind is "analyze" (the /api analysis) or "qr_sandbox"
+    (container + browser analysis of the QR content). Poll /jobs/{job_id}, or pass callback_url to
+    have the finished job POSTed to you.
+    """
     try:
-        # Read image from uploaded file
-        image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes))
-
-        # Run object and QR detection concurrently
-        detection_result, qr_details = await asyncio.gather(
-            detect.run_detection(image),
-            qr_checker.process_qr_scan(image),
-        )
+        params = {"digest": upload.digest, "filename": upload.filename, "analyzers": names}
+        job = await jobs.submit(kind, upload.read(), params, callback_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"job_id": job["id"], "status": job["status"], "status_url": f"/jobs/{job['id']}"}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+@app.post("/extension", openapi_extra=ingest.UPLOAD_OPENAPI)
+async def process_extension_image(names: list = Depends(select_analyzers(["objects", "qr"])),
+                                  upload: IngestedUpload = Depends(ingest.stream_upload)):
+
+    try:
+        # Open the streamed upload without copying it
+        image = upload.open_image()
+        digest = upload.digest
+
+        # Run object and QR detection (or the caller's selection) concurrently
+        results = await analyzers.run_analyzers(image, digest, names)
+        detection_result, qr_details = results.get("objects", []), results.get("qr", {})
+
+        # A timed-out detector contributes nothing rather than failing the whole verdict
+        if analyzers.is_timed_out(detection_result):
+            detection_result = []
+        if analyzers.is_timed_out(qr_details):
+            qr_details = {}
 
         detected_objects = [val["object"] for val in detection_result]
         vul = "Low"
@@ -194,12 +426,11 @@ async def process_image(file: UploadFile = File(...)):
         return {"error": f"Processing error: {str(e)}"}
     
 	
-@app.post("/process_qr_with_gpt")	
-async def process_qr_with_gpt(file: UploadFile = File(...)):
+@app.post("/process_qr_with_gpt", openapi_extra=ingest.UPLOAD_OPENAPI)	
+async def process_qr_with_gpt(upload: IngestedUpload = Depends(ingest.stream_upload)):
 
     try:
-        image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes))
+        image = upload.open_image()
 
         # Run QR detection
         qr_details = await qr_checker.process_qr_scan(image)
@@ -231,9 +462,21 @@ if __name__ == "__main__":
     # Increase worker count for concurrency
     uvicorn.run("main:app", host="0.0.0.0", port=8000)
 
-from fastapi import FastAPI
-
-app = FastAPI()
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "result_cache": {"hits": result_cache.hits, "misses": result_cache.misses, "memory_bytes": result_cache.memory.size},
+        "near_duplicates": near_duplicates.summary(),
+    }
+
+@app.get("/metrics")
+def load_metrics():
+    return admission.metrics()
+
+@app.get("/ready")
+def readiness():
+    # Readiness, unlike the / liveness check, only passes once every model is loaded and warmed
+    return JSONResponse(warmup.status, status_code=200 if warmup.status["ready"] else 503)
 
 @app.get("/")
 def read_root():
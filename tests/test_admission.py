@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+import main
+from utils.pipeline.admission import AdmissionController, Overloaded
+
+
+def test_released_slots_go_to_waiters_in_fifo_order():
+    async def scenario():
+        controller = AdmissionController("test", max_active=1, max_queue=3, queue_timeout=5)
+        order = []
+        await controller.acquire()
+
+        async def request(name):
+            async with controller.slot():
+                order.append(name)
+
+        waiters = [asyncio.ensure_future(request(name)) for name in ("a", "b", "c")]
+        await asyncio.sleep(0)
+        assert controller.summary()["queue_depth"] == 3
+        controller.release()
+        await asyncio.gather(*waiters)
+        return order, controller.summary()
+
+    order, summary = asyncio.run(scenario())
+    assert order == ["a", "b", "c"]
+    assert summary["active"] == 0
+    assert summary["admitted"] == 4
+
+
+def test_full_queue_is_rejected_at_once():
+    async def scenario():
+        controller = AdmissionController("test", max_active=1, max_queue=1, queue_timeout=5)
+        await controller.acquire()
+        waiter = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as error:
+            await controller.acquire()
+        controller.release()
+        await waiter
+        return controller, error.value
+
+    controller, error = asyncio.run(scenario())
+    assert controller.rejected == 1
+    assert 1 <= error.retry_after <= 60
+
+
+def test_queue_wait_times_out():
+    async def scenario():
+        controller = AdmissionController("test", max_active=1, max_queue=2, queue_timeout=0.05)
+        await controller.acquire()
+        with pytest.raises(Overloaded):
+            await controller.acquire()
+        return controller.summary()
+
+    summary = asyncio.run(scenario())
+    assert summary["timed_out"] == 1
+    assert summary["queue_depth"] == 0
+    assert summary["active"] == 1
+
+
+def test_heavy_endpoints_are_admission_controlled():
+    middleware = next(m for m in main.app.user_middleware if m.cls is main.admission.AdmissionMiddleware)
+    routes = middleware.kwargs["routes"]
+    assert routes["/api/batch"] is main.admission.controllers["batch"]
+    assert routes["/process_qr_with_gpt"] is main.admission.controllers["api"]
@@ -0,0 +1,45 @@
+import pytest
+
+from utils.pipeline import analyzers
+
+
+@pytest.fixture
+def faces_on_persons(monkeypatch):
+    monkeypatch.setattr(analyzers.ANALYZERS["faces"], "requires", ("objects",))
+
+
+def test_with_dependencies_orders_requirements_first(faces_on_persons):
+    assert analyzers.with_dependencies(["faces", "qr"]) == ["objects", "faces", "qr"]
+    assert analyzers.with_dependencies(["objects", "faces", "objects"]) == ["objects", "faces"]
+
+
+def test_select_explicit_list_deduplicates_and_keeps_order(monkeypatch):
+    monkeypatch.setattr(analyzers, "ENABLED", list(analyzers.ANALYZERS))
+    assert analyzers.select("qr, objects,qr", None, ["nsfw"]) == ["qr", "objects"]
+
+
+def test_select_profile_and_default(monkeypatch):
+    monkeypatch.setattr(analyzers, "ENABLED", list(analyzers.ANALYZERS))
+    assert analyzers.select(None, "fast", ["llm"]) == analyzers.PROFILES["fast"]
+    assert analyzers.select(None, None, ["objects", "qr"]) == ["objects", "qr"]
+
+
+def test_select_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        analyzers.select("objects,telepathy", None, [])
+    with pytest.raises(ValueError):
+        analyzers.select(None, "everything", [])
+
+
+def test_select_narrows_default_to_worker_role(monkeypatch, faces_on_persons):
+    monkeypatch.setattr(analyzers, "ENABLED", analyzers.enabled_analyzers("extension"))
+    assert analyzers.select(None, None, ["objects", "qr", "faces", "llm"]) == ["objects", "qr"]
+    # An explicit choice the role does not serve is an error, not silently dropped
+    with pytest.raises(ValueError):
+        analyzers.select("faces", None, [])
+
+
+def test_enabled_analyzers_adds_dependencies(faces_on_persons):
+    assert analyzers.enabled_analyzers("faces") == ["objects", "faces"]
+    with pytest.raises(ValueError):
+        analyzers.enabled_analyzers("nope")
@@ -0,0 +1,41 @@
+import asyncio
+
+import main
+from utils.pipeline import analyzers
+
+FACES = {"object": "Face", "coordinates": [{"x": 1, "y": 2, "width": 3, "height": 4}]}
+PERSON = [{"object": "Person", "coordinates": [{"x": 0, "y": 0, "width": 10, "height": 10}]}]
+
+
+def test_faces_are_merged_into_finished_objects():
+    response = main.build_api_response({"objects": list(PERSON), "faces": FACES})
+    assert response["detected_objects"] == PERSON + [FACES]
+    assert "face_details" not in response
+
+
+def test_timed_out_faces_are_reported():
+    response = main.build_api_response({"objects": list(PERSON), "faces": analyzers.timed_out(1.0)})
+    assert response["detected_objects"] == PERSON
+    assert response["face_details"] == {"timed_out": True, "after_seconds": 1.0}
+    assert response["timed_out"] == ["faces"]
+
+
+def test_finished_faces_survive_timed_out_objects(monkeypatch):
+    async def slow_objects(image):
+        await asyncio.sleep(5)
+
+    async def quick_faces(image):
+        return FACES
+
+    monkeypatch.setattr(analyzers.ANALYZERS["objects"], "run", slow_objects)
+    monkeypatch.setattr(analyzers.ANALYZERS["objects"], "deadline", 0.05)
+    monkeypatch.setattr(analyzers.ANALYZERS["faces"], "run", quick_faces)
+    monkeypatch.setattr(analyzers.ANALYZERS["faces"], "requires", ())
+    monkeypatch.setattr(analyzers.ANALYZERS["faces"], "deadline", 1.0)
+
+    results = asyncio.run(analyzers.run_analyzers(None, None, ["objects", "faces"]))
+    response = main.build_api_response(results)
+
+    assert analyzers.is_timed_out(response["detected_objects"])
+    assert response["face_details"] == FACES
+    assert response["timed_out"] == ["objects"]
@@ -0,0 +1,55 @@
+import asyncio
+
+from PIL import Image
+
+from utils.ObjectModel import detect
+from utils.pipeline import batching
+from utils.pipeline.image_context import ImageContext
+
+
+def test_micro_batcher_groups_concurrent_items():
+    calls = []
+
+    async def run_batch(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    async def scenario():
+        batcher = batching.MicroBatcher("test", run_batch, max_batch_size=4, max_wait_ms=50)
+        results = await asyncio.gather(*[batcher.submit(i) for i in range(4)])
+        await batcher.close()
+        return results
+
+    assert asyncio.run(scenario()) == [0, 2, 4, 6]
+    assert calls == [[0, 1, 2, 3]]
+
+
+def test_route_batch_size_batches_images_of_one_request(monkeypatch):
+    calls = []
+
+    async def run_detection_batch(contexts):
+        calls.append(len(contexts))
+        return [[] for _ in contexts]
+
+    monkeypatch.setattr(detect, "run_detection_batch", run_detection_batch)
+    monkeypatch.setattr(detect, "_batchers", {})
+    monkeypatch.setattr(detect.config, "YOLO_BATCH_SIZE", 1)
+    monkeypatch.setattr(detect.config, "YOLO_BATCH_WAIT_MS", 200)
+
+    async def scan():
+        # As /api/batch does in each image's own task
+        batching.route_batch_size.set(3)
+        return await detect.run_detection(ImageContext(Image.new("RGB", (32, 32))))
+
+    async def scenario():
+        results = await asyncio.gather(*[scan() for _ in range(3)])
+        await detect.close_batchers()
+        return results
+
+    assert asyncio.run(scenario()) == [[], [], []]
+    assert calls == [3]
+
+
+def test_batch_size_defaults_to_configured():
+    assert batching.batch_size(1) == 1
+    assert batching.batch_size(4) == 4
@@ -0,0 +1,40 @@
+import threading
+
+import numpy as np
+import pytest
+
+from utils.faceDetect import backends
+
+
+def test_ssd_blob_subtracts_bgr_training_means():
+    rgb = np.empty((10, 10, 3), dtype=np.uint8)
+    rgb[...] = (200, 100, 50)
+    blob = backends.ssd_blob(rgb)
+    assert blob.shape == (1, 3, 300, 300)
+    # Channels come out as B, G, R minus means 104, 177, 123
+    assert blob[0, :, 0, 0].tolist() == [50 - 104, 100 - 177, 200 - 123]
+
+
+class FakeNet:
+    def setInput(self, blob):
+        self.blob = blob
+
+    def forward(self):
+        output = np.zeros((1, 1, 3, 7), dtype=np.float32)
+        output[0, 0, 0, 2:7] = [0.9, 0.1, 0.2, 0.5, 0.6]
+        output[0, 0, 1, 2:7] = [0.1, 0.0, 0.0, 1.0, 1.0]
+        output[0, 0, 2, 2:7] = [0.8, 0.5, 0.5, 0.5, 0.5]
+        return output
+
+
+def test_ssd_detect_scales_boxes_and_drops_low_scores():
+    backend = backends.SSDBackend.__new__(backends.SSDBackend)
+    backend._local = threading.local()
+    backend._local.model = FakeNet()
+    faces = backend.detect(np.zeros((100, 200, 3), dtype=np.uint8))
+    assert faces == [{"box": [20, 20, 80, 40], "confidence": pytest.approx(0.9)}]
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        backends.create_backend("nope")
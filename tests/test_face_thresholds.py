@@ -0,0 +1,51 @@
+import asyncio
+
+import numpy as np
+from PIL import Image
+
+from utils.faceDetect import backends, face_detection
+
+DETECTIONS = [
+    {"box": [1, 2, 3, 4], "confidence": 0.95},
+    {"box": [5, 6, 7, 8], "confidence": 0.7},
+    {"box": [9, 9, 2, 2], "confidence": 0.4},
+]
+
+
+class FakeBackend(backends.FaceBackend):
+    def __init__(self):
+        self.calls = 0
+
+    def detect(self, rgb_image):
+        self.calls += 1
+        return DETECTIONS
+
+
+def test_best_threshold_keeps_most_faces_and_counts_every_threshold():
+    faces, counts = face_detection.best_threshold(DETECTIONS, [0.9, 0.6, 0.5])
+    assert counts == {"0.9": 1, "0.6": 2, "0.5": 2}
+    # 0.6 and 0.5 tie; the first one wins, as with the old per-threshold loop
+    assert faces == face_detection.filter_faces(DETECTIONS, 0.6)
+
+
+def test_best_threshold_without_faces():
+    assert face_detection.best_threshold([], [0.9]) == (None, {"0.9": 0})
+    assert face_detection.best_threshold(DETECTIONS, [0.99]) == (None, {"0.99": 0})
+
+
+def test_find_best_faces_runs_the_detector_once():
+    backend = FakeBackend()
+    faces, counts = face_detection.find_best_faces(np.zeros((20, 20, 3), np.uint8), [0.99, 0.9, 0.8, 0.6, 0.3],
+                                                   backend)
+    assert backend.calls == 1
+    assert len(faces) == 3
+    assert counts == {"0.99": 0, "0.9": 1, "0.8": 1, "0.6": 2, "0.3": 3}
+
+
+def test_process_image_returns_threshold_counts(monkeypatch):
+    monkeypatch.setattr(face_detection, "_detector", FakeBackend())
+    monkeypatch.setattr(face_detection.config, "FACE_BATCH_SIZE", 1)
+    result = asyncio.run(face_detection.process_image(Image.new("RGB", (64, 64)), [0.9, 0.6]))
+    assert result["object"] == "Face"
+    assert len(result["coordinates"]) == 2
+    assert result["threshold_counts"] == {"0.9": 1, "0.6": 2}
@@ -0,0 +1,50 @@
+import io
+
+import pytest
+from PIL import Image
+
+from utils.pipeline import image_context
+from utils.pipeline.image_context import ImageContext
+
+
+def encode(fmt, size=(2400, 1600)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (120, 60, 30)).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def opens(monkeypatch):
+    """Counts how often the upload bytes are opened (and so decoded) again."""
+    calls = []
+    original = image_context.Image.open
+
+    def counting_open(fp, *args, **kwargs):
+        calls.append(fp)
+        return original(fp, *args, **kwargs)
+
+    monkeypatch.setattr(image_context.Image, "open", counting_open)
+    return calls
+
+
+@pytest.mark.parametrize("fmt", ["PNG", "WEBP", "BMP"])
+def test_non_jpeg_is_decoded_once_for_every_size(fmt, opens):
+    context = ImageContext.from_bytes(encode(fmt))
+    opens.clear()
+    sides = (1280, 1920, 1568, 256)
+    reduced = [context.reduced(side) for side in sides]
+    context.load()
+
+    assert opens == []
+    for side, small in zip(sides, reduced):
+        assert small.width == side
+        assert small.scale == pytest.approx((2400 / small.width, 1600 / small.height))
+
+
+def test_jpeg_reduced_sizes_use_draft_decodes(opens):
+    context = ImageContext.from_bytes(encode("JPEG"))
+    opens.clear()
+    assert context.reduced(600).size == (600, 400)
+    # Decoded from the JPEG bytes at reduced size, the full frame was never loaded
+    assert len(opens) == 1
+    assert "loaded" not in context._memo
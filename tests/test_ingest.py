@@ -0,0 +1,71 @@
+import io
+import struct
+import zlib
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from utils.pipeline import ingest
+
+
+def encode(fmt, size=(16, 16)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (10, 20, 30)).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def png_claiming(width, height):
+    """A small PNG whose header declares width x height pixels."""
+    data = bytearray(encode("PNG"))
+    ihdr = struct.pack(">II", width, height) + bytes(data[24:29])
+    data[16:29] = ihdr
+    data[29:33] = struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+    return bytes(data)
+
+
+def feed(data, chunk_size=7):
+    sink = ingest.ImageSink("upload")
+    for start in range(0, len(data), chunk_size):
+        sink.write(data[start:start + chunk_size])
+    return sink.finish()
+
+
+@pytest.mark.parametrize("fmt, expected", [
+    ("JPEG", "JPEG"), ("PNG", "PNG"), ("GIF", "GIF"), ("BMP", "BMP"), ("TIFF", "TIFF"), ("WEBP", "WEBP"),
+])
+def test_sniff_format(fmt, expected):
+    assert ingest.sniff_format(encode(fmt)[:12]) == expected
+
+
+def test_sniff_format_rejects_other_content():
+    assert ingest.sniff_format(b"%PDF-1.7\n%\xe2\xe3") is None
+    assert ingest.sniff_format(b"RIFF\x00\x00\x00\x00AVI ") is None
+
+
+def test_sink_accepts_valid_image_in_small_chunks():
+    data = encode("PNG")
+    upload = feed(data)
+    assert upload.format == "PNG"
+    assert upload.read() == data
+
+
+def test_sink_rejects_unknown_format():
+    with pytest.raises(HTTPException) as error:
+        feed(b"not an image at all, just text")
+    assert error.value.status_code == 415
+
+
+def test_sink_rejects_decompression_bomb_from_header(monkeypatch):
+    monkeypatch.setattr(ingest.config, "MAX_IMAGE_PIXELS", 1_000_000)
+    # Declares 50000x50000 pixels in a body of a few dozen bytes
+    with pytest.raises(HTTPException) as error:
+        feed(png_claiming(50_000, 50_000))
+    assert error.value.status_code == 413
+
+
+def test_sink_rejects_oversized_upload(monkeypatch):
+    monkeypatch.setattr(ingest.config, "MAX_UPLOAD_BYTES", 100)
+    with pytest.raises(HTTPException) as error:
+        feed(encode("BMP", (64, 64)))
+    assert error.value.status_code == 413
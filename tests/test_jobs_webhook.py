@@ -0,0 +1,66 @@
+import asyncio
+import socket
+
+import httpx
+import pytest
+
+from utils.jobs import worker
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://example.com/hook",
+    "http://127.0.0.1/hook",
+    "http://localhost:8000/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.1/hook",
+    "http://[::1]/hook",
+])
+def test_callback_url_rejects_non_public_targets(monkeypatch, url):
+    monkeypatch.setattr(worker.config, "JOB_WEBHOOK_ALLOWED_HOSTS", [])
+    with pytest.raises(ValueError):
+        asyncio.run(worker.check_callback_url(url))
+
+
+def test_callback_url_accepts_public_address(monkeypatch):
+    monkeypatch.setattr(worker.config, "JOB_WEBHOOK_ALLOWED_HOSTS", [])
+    asyncio.run(worker.check_callback_url("https://93.184.215.14/hook"))
+
+
+def test_callback_url_allow_list(monkeypatch):
+    monkeypatch.setattr(worker.config, "JOB_WEBHOOK_ALLOWED_HOSTS", ["hooks.internal"])
+    asyncio.run(worker.check_callback_url("http://hooks.internal/done"))
+    with pytest.raises(ValueError):
+        asyncio.run(worker.check_callback_url("https://93.184.215.14/hook"))
+
+
+def test_delivery_connects_to_the_checked_address(monkeypatch):
+    # The second lookup of a rebinding name would answer 127.0.0.1; the POST must not resolve again
+    monkeypatch.setattr(worker.config, "JOB_WEBHOOK_ALLOWED_HOSTS", [])
+    monkeypatch.setattr(worker.config, "JOB_WEBHOOK_SECRET", "")
+    answers = iter(["93.184.215.14", "127.0.0.1"])
+
+    async def getaddrinfo(self, host, port, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (next(answers), port))]
+
+    sent = []
+
+    def handler(request):
+        sent.append(request)
+        return httpx.Response(200)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(asyncio.BaseEventLoop, "getaddrinfo", getaddrinfo)
+    monkeypatch.setattr(worker.executor, "get_http_client", lambda: client)
+    asyncio.run(worker.deliver_webhook({"id": "1", "callback_url": "https://hooks.example.com:8443/done"}))
+
+    assert len(sent) == 1
+    assert sent[0].url.host == "93.184.215.14" and sent[0].url.port == 8443
+    assert sent[0].headers["Host"] == "hooks.example.com:8443"
+    assert sent[0].extensions["sni_hostname"] == "hooks.example.com"
+
+
+def test_pin_address_brackets_ipv6():
+    url, headers, extensions = worker.pin_address("http://hooks.example.com/done?x=1", "2606:2800:220:1::1")
+    assert url == "http://[2606:2800:220:1::1]/done?x=1"
+    assert headers == {"Host": "hooks.example.com"} and extensions == {}
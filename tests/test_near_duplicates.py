@@ -0,0 +1,55 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.cache.phash import NearDuplicateIndex
+from utils.cache.result_cache import ResultCache
+from utils.pipeline import analyzers
+from utils.pipeline.image_context import ImageContext
+
+PERSON = [{"object": "Person", "coordinates": [{"x": 10, "y": 10, "width": 50, "height": 50}]}]
+
+
+def encode(quality):
+    blocks = np.random.default_rng(0).integers(0, 256, (8, 8), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(np.kron(blocks, np.ones((32, 32), dtype=np.uint8))).convert("RGB").save(
+        buffer, "JPEG", quality=quality)
+    return ImageContext.from_bytes(buffer.getvalue())
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    calls = []
+
+    async def objects(image):
+        calls.append(image)
+        return PERSON
+
+    monkeypatch.setattr(analyzers.ANALYZERS["objects"], "run", objects)
+    monkeypatch.setattr(analyzers.config, "PHASH_ENABLED", True)
+    monkeypatch.setattr(analyzers.config, "RESULT_CACHE_ENABLED", True)
+    monkeypatch.setattr(analyzers, "near_duplicate_index", NearDuplicateIndex("phash", 6, 100))
+    monkeypatch.setattr(analyzers, "result_cache", ResultCache(1024 * 1024))
+    return calls
+
+
+def run(image, digest, **kwargs):
+    return asyncio.run(analyzers.run_analyzers(image, digest, ["objects"], **kwargs))
+
+
+def test_near_duplicate_reuses_results(runs):
+    run(encode(95), "original")
+    assert run(encode(60), "recompressed") == {"objects": PERSON}
+    assert len(runs) == 1
+
+
+def test_without_near_duplicates_the_image_is_analysed_itself(runs):
+    run(encode(95), "original")
+    run(encode(60), "recompressed")
+    # A reused result is not cached under the copy's digest, so it cannot leak into exact-content lookups
+    run(encode(60), "recompressed", near_duplicates=False)
+    assert len(runs) == 2
@@ -0,0 +1,48 @@
+import random
+
+import numpy as np
+from PIL import Image
+
+from utils.cache.phash import BKTree, NearDuplicateIndex, hamming, phash
+
+
+def test_bk_tree_search_matches_brute_force():
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) for _ in range(500)]
+    tree = BKTree()
+    for index, hash_value in enumerate(hashes):
+        tree.add(hash_value, index)
+
+    for _ in range(20):
+        query = hashes[rng.randrange(len(hashes))] ^ (1 << rng.randrange(64))
+        expected = sorted(
+            (hamming(query, hash_value), index) for index, hash_value in enumerate(hashes)
+            if hamming(query, hash_value) <= 12
+        )
+        found = tree.search(query, 12)
+        assert sorted(found) == expected
+        assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+
+
+def test_bk_tree_empty():
+    assert BKTree().search(0, 64) == []
+
+
+def test_near_duplicate_index_keeps_newest_entries():
+    index = NearDuplicateIndex("phash", max_distance=0, max_entries=4)
+    for value in range(10):
+        index.add(value, value)
+    assert index.lookup(9) == (0, 9)
+    assert index.lookup(0) is None
+    assert index.summary()["entries"] <= 5
+
+
+def test_phash_tolerates_resizing():
+    rng = np.random.default_rng(0)
+    blocks = rng.integers(0, 256, (8, 8), dtype=np.uint8)
+    image = Image.fromarray(np.kron(blocks, np.ones((64, 64), dtype=np.uint8))).convert("RGB")
+    resized = image.resize((300, 300), Image.Resampling.BILINEAR)
+    other = Image.fromarray(rng.integers(0, 256, (512, 512), dtype=np.uint8)).convert("RGB")
+
+    assert hamming(phash(image), phash(resized)) <= 4
+    assert hamming(phash(image), phash(other)) > 10
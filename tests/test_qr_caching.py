@@ -0,0 +1,45 @@
+import asyncio
+
+import httpx
+import pytest
+
+from utils.cache.result_cache import Uncached
+from utils.qr_code import qr_checker
+
+
+def analyze(monkeypatch, content=None, error=None):
+    async def decode_qr(image):
+        return content, error
+
+    monkeypatch.setattr(qr_checker, "decode_qr", decode_qr)
+    return asyncio.run(qr_checker.analyze_qr(None))
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    async def head(*args, **kwargs):
+        raise httpx.ConnectTimeout("timed out")
+
+    class Client:
+        pass
+
+    client = Client()
+    client.head = head
+    monkeypatch.setattr(qr_checker.executor, "get_http_client", lambda: client)
+
+
+def test_failed_short_link_resolution_is_not_cached(monkeypatch, offline):
+    result = analyze(monkeypatch, content="https://bit.ly/abc123")
+    assert isinstance(result, Uncached)
+    assert result.value["content"] == "https://bit.ly/abc123"
+
+
+def test_decoder_failure_is_not_cached(monkeypatch):
+    result = analyze(monkeypatch, error="Error decoding QR code: libzbar missing")
+    assert isinstance(result, Uncached)
+
+
+def test_stable_verdicts_are_cached(monkeypatch):
+    assert analyze(monkeypatch, error=qr_checker.NO_QR_CODE) == {"error": qr_checker.NO_QR_CODE}
+    assert analyze(monkeypatch, content="plain text, no URL") == {"content": "plain text, no URL",
+                                                                  "is_malicious": False}
@@ -0,0 +1,66 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.pipeline import redact
+from utils.pipeline.image_context import ImageContext
+
+RESULTS = {
+    "objects": [
+        {"object": "Credit Card", "coordinates": [{"x": 10, "y": 10, "width": 40, "height": 30}]},
+        {"object": "Person", "coordinates": [{"x": 60, "y": 10, "width": 40, "height": 30}]},
+    ],
+    "faces": {"object": "Face", "coordinates": [{"x": 20, "y": 50, "width": 30, "height": 30}]},
+}
+
+
+def noise(width=120, height=90):
+    # 6px blocks of random grey: blurring wipes them out, lossy encoding mostly keeps them
+    blocks = np.random.default_rng(0).integers(0, 256, (height // 6, width // 6), dtype=np.uint8)
+    return np.repeat(np.kron(blocks, np.ones((6, 6), dtype=np.uint8))[..., np.newaxis], 3, axis=2)
+
+
+def encode(array, fmt, **params):
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def decode(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+def test_regions_keep_only_redacted_labels():
+    found = redact.regions(RESULTS, 120, 90)
+    assert found == [(6, 7, 54, 43), (17, 47, 53, 83)]
+
+
+@pytest.mark.parametrize("fmt", ["GIF", "BMP", "TIFF", "PNG"])
+@pytest.mark.parametrize("mode", redact.MODES)
+def test_redact_formats_without_legacy_exif(fmt, mode):
+    original = noise()
+    source = ImageContext.from_bytes(encode(original, fmt))
+    output = decode(redact.redact(source, RESULTS, mode, "webp"))
+
+    assert output.shape == original.shape
+    source_pixels = np.asarray(source.rgb).astype(int)
+    # The face region is obscured; the person box (not a redacted label) is left alone
+    assert np.abs(output[50:80, 20:50].astype(int) - source_pixels[50:80, 20:50]).mean() > 15
+    assert np.abs(output[15:35, 70:95].astype(int) - source_pixels[15:35, 70:95]).mean() < 5
+
+
+def test_redact_strips_exif_and_applies_orientation():
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x0110] = "Camera"
+    source = ImageContext.from_bytes(encode(noise(), "JPEG", exif=exif.tobytes()))
+    output = Image.open(io.BytesIO(redact.redact(source, RESULTS, "blur", "jpeg")))
+    assert output.size == (90, 120)
+    assert not output.getexif()
+
+
+def test_exif_of_formats_without_it():
+    assert ImageContext.from_bytes(encode(noise(), "GIF")).exif == {}
+    assert ImageContext.from_bytes(encode(noise(), "BMP")).orientation == 1
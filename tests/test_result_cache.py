@@ -0,0 +1,40 @@
+import asyncio
+
+from utils.cache.result_cache import MISS, MemoryTier, Uncached, make_key
+from utils.pipeline import analyzers
+
+
+def test_memory_tier_evicts_least_recently_used():
+    tier = MemoryTier(max_bytes=10)
+    tier.set("a", "12345")
+    tier.set("b", "12345")
+    tier.get("a")
+    tier.set("c", "12345")
+    assert tier.get("a") == "12345"
+    assert tier.get("b") is None
+    assert tier.size == 10
+
+
+def test_uncached_result_is_returned_but_not_stored(monkeypatch):
+    analyzer = analyzers.ANALYZERS["nsfw"]
+
+    async def failing(image):
+        return Uncached(False)
+
+    async def passing(image):
+        return True
+
+    async def scenario():
+        monkeypatch.setattr(analyzer, "run", failing)
+        assert await analyzers.compute("nsfw", None, "digest-failed") is False
+        assert await analyzers.get_cached("nsfw", "digest-failed") is MISS
+
+        monkeypatch.setattr(analyzer, "run", passing)
+        assert await analyzers.compute("nsfw", None, "digest-passed") is True
+        assert await analyzers.get_cached("nsfw", "digest-passed") is True
+
+    asyncio.run(scenario())
+
+
+def test_key_includes_analyzer_version():
+    assert make_key("d", "objects", "1") != make_key("d", "objects", "2")
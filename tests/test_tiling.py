@@ -0,0 +1,54 @@
+import pytest
+
+from utils.ObjectModel import detect
+
+
+def covered(windows, width, height):
+    return all(
+        any(left <= x < right and top <= y < bottom for left, top, right, bottom in windows)
+        for y in range(0, height, 7) for x in range(0, width, 7)
+    ) and all(right <= width and bottom <= height for _, _, right, bottom in windows)
+
+
+@pytest.mark.parametrize("width, height", [(3000, 2000), (1024, 1024), (1500, 600), (500, 400)])
+def test_tile_windows_cover_the_image_within_bounds(width, height):
+    windows = detect.tile_windows(width, height, 1024, 0.2)
+    assert covered(windows, width, height)
+    assert len(set(windows)) == len(windows)
+
+
+def test_tile_windows_overlap_and_end_flush():
+    windows = detect.tile_windows(3000, 1024, 1024, 0.25)
+    lefts = sorted({left for left, _, _, _ in windows})
+    assert lefts == [0, 768, 1536, 1976]
+    assert max(right for _, _, right, _ in windows) == 3000
+
+
+def test_merge_boxes_suppresses_overlaps_per_class():
+    boxes = [
+        (0, 0, 100, 100, 0.9, "Person"),
+        (5, 5, 105, 105, 0.8, "Person"),
+        (5, 5, 105, 105, 0.7, "Knife"),
+        (300, 300, 350, 350, 0.6, "Person"),
+    ]
+    merged = detect.merge_boxes(boxes, 0.5)
+    assert sorted(merged, key=lambda box: (box[5], box[0])) == [
+        (5, 5, 105, 105, 0.7, "Knife"),
+        (0, 0, 105, 105, 0.9, "Person"),
+        (300, 300, 350, 350, 0.6, "Person"),
+    ]
+
+
+def test_merge_boxes_joins_fragment_cut_by_tile_edge():
+    # The whole-frame pass sees the object; a tile sees only its left part, with a higher score
+    boxes = [(100, 100, 300, 200, 0.6, "Id Card"), (100, 100, 180, 200, 0.9, "Id Card")]
+    assert detect.merge_boxes(boxes, 0.5) == [(100, 100, 300, 200, 0.9, "Id Card")]
+
+
+def test_detection_list_from_boxes_groups_by_class():
+    boxes = [(1, 2, 11, 22, 0.9, "Person"), (5, 5, 6, 6, 0.5, "Person"), (0, 0, 4, 4, 0.7, "Knife")]
+    assert detect.detection_list_from_boxes(boxes) == [
+        {"object": "Person", "coordinates": [{"x": 1, "y": 2, "width": 10, "height": 20},
+                                             {"x": 5, "y": 5, "width": 1, "height": 1}]},
+        {"object": "Knife", "coordinates": [{"x": 0, "y": 0, "width": 4, "height": 4}]},
+    ]
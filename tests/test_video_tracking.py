@@ -0,0 +1,47 @@
+from utils.video import video_analysis
+from utils.video.video_analysis import IoUTracker
+
+
+def person(x, y, size=100):
+    return {"object": "Person", "coordinates": [{"x": x, "y": y, "width": size, "height": size}]}
+
+
+def test_tracker_links_moving_box_across_keyframes():
+    tracker = IoUTracker(min_iou=0.3)
+    tracker.update(0, 0.0, [person(0, 0)])
+    tracker.update(1, 0.5, [person(20, 0)])
+    tracker.update(2, 1.0, [person(40, 0)])
+    assert len(tracker.tracks) == 1
+    assert [box["x"] for box in tracker.tracks[0]["boxes"]] == [0, 20, 40]
+    assert tracker.tracks[0]["start"] == 0.0
+
+
+def test_tracker_starts_new_track_on_jump_or_other_label():
+    tracker = IoUTracker(min_iou=0.3)
+    tracker.update(0, 0.0, [person(0, 0)])
+    tracker.update(1, 0.5, [person(500, 500), {"object": "Knife", "coordinates": [
+        {"x": 0, "y": 0, "width": 100, "height": 100}]}])
+    assert [(track["id"], track["object"]) for track in tracker.tracks] == [(1, "Person"), (2, "Person"), (3, "Knife")]
+
+
+def test_tracker_matches_each_box_once():
+    tracker = IoUTracker(min_iou=0.3)
+    tracker.update(0, 0.0, [person(0, 0)])
+    tracker.update(1, 0.5, [{"object": "Person", "coordinates": [
+        {"x": 10, "y": 0, "width": 100, "height": 100}, {"x": 5, "y": 0, "width": 100, "height": 100}]}])
+    assert len(tracker.tracks) == 2
+    # The better-overlapping box continues the track
+    assert tracker.tracks[0]["boxes"][-1]["x"] == 5
+
+
+def test_trackable_skips_failed_sections():
+    faces = {"object": "Face", "coordinates": [{"x": 1, "y": 1, "width": 2, "height": 2}]}
+    assert video_analysis._trackable({"objects": {"timed_out": True}, "faces": faces}) == [faces]
+    assert video_analysis._trackable({"objects": [person(0, 0)], "faces": {}}) == [person(0, 0)]
+
+
+def test_sniff_video():
+    assert video_analysis.sniff_video(b"\x00\x00\x00\x18ftypmp42") == "mp4"
+    assert video_analysis.sniff_video(b"\x1a\x45\xdf\xa3\x00\x00\x00\x00\x00\x00\x00\x00") == "mkv"
+    assert video_analysis.sniff_video(b"RIFF\x00\x00\x00\x00AVI ") == "avi"
+    assert video_analysis.sniff_video(b"\x89PNG\r\n\x1a\n\x00\x00\x00\x00") is None
@@ -1,24 +1,224 @@
-from ultralytics import YOLO
+import asyncio
+import os
+import queue
+from typing import List, Tuple
+
+import numpy as np
 from PIL import Image
 
+from config import config
+from utils.pipeline import batching, executor, inference_pool
+from utils.pipeline.coordinates import scale_detections
+from utils.pipeline.image_context import ImageContext
+
+
+MODEL_PATH = "utils/ObjectModel/best.pt"
+
+# Bump whenever best.pt or the detection_list format changes so cached results are not reused.
+# Exported (and especially int8) models can differ slightly, so they get their own cache entries.
+ANALYZER_VERSION = "1"
+if config.YOLO_WEIGHTS != MODEL_PATH:
+    ANALYZER_VERSION += "-" + os.path.basename(config.YOLO_WEIGHTS.rstrip("/"))
+if config.YOLO_TILE_MIN_SIDE:
+    ANALYZER_VERSION += f"-tiled{config.YOLO_TILE_SIZE}"
+
+# A box mostly inside a better one of the same class is a fragment of it cut at a tile edge
+FRAGMENT_OVERLAP = 0.8
+
+# Ultralytics predictors are not thread-safe, so each concurrent pool call checks out its own model.
+# Models are loaded on first use (or by the warm-up), so importing this module stays cheap.
+_idle_models = queue.LifoQueue()
+
 
-# Load the pre-trained YOLO model
-model = YOLO("utils/ObjectModel/best.pt")
+def load_model(weights: str = None):
+    # ultralytics pulls in torch; only processes that actually run YOLO pay for it
+    from ultralytics import YOLO
+    # Ultralytics picks PyTorch, ONNX Runtime or OpenVINO from the weights path; results look the same
+    return YOLO(weights or config.YOLO_WEIGHTS, task="detect")
+
+
+def checkout_model():
+    try:
+        return _idle_models.get_nowait()
+    except queue.Empty:
+        return load_model()
+
+
+def release_model(yolo_model):
+    _idle_models.put(yolo_model)
+
+
+# Created lazily so they bind to the running event loop; one per batch size in use
+_batchers = {}
 
 
 async def run_detection(image: Image):
-    # Perform object detection on the input image
-    results = model.predict(image)
+    # Small objects vanish when a large photo is shrunk to 640, so large photos are tiled instead
+    if config.YOLO_TILE_MIN_SIDE and max(image.size) >= config.YOLO_TILE_MIN_SIDE:
+        return await run_tiled_detection(ImageContext.wrap(image))
+
+    # YOLO letterboxes to 640 anyway, so decode straight to a reduced size and map boxes back
+    context = await executor.run_blocking(
+        "encode", ImageContext.wrap(image).reduced, config.YOLO_DECODE_MAX_SIDE
+    )
+
+    # Coalesce concurrent requests into one batched predict when batching is enabled
+    batch_size = batching.batch_size(config.YOLO_BATCH_SIZE)
+    if batch_size > 1:
+        detection_list = await get_batcher(batch_size).submit(context)
+
+    # Run the blocking YOLO inference on the inference workers or the bounded detection pool
+    elif inference_pool.enabled():
+        detection_list = await inference_pool.run_detection(context)
+    else:
+        detection_list = (await executor.run_blocking("yolo", detect_contexts, [context]))[0]
+
+    return scale_detections(detection_list, *context.scale)
+
+
+async def run_detection_batch(contexts: List[ImageContext]):
+    # One predict call over the whole batch, fanned back out per image
+    if inference_pool.enabled():
+        return await inference_pool.run_detection_batch(contexts)
+    return await executor.run_blocking("yolo", detect_contexts, contexts)
+
+
+def detect_contexts(contexts: List[ImageContext]):
+    # Ultralytics reads numpy input as BGR; the shared BGR view avoids another frame copy
+    return detect_objects_batch([context.bgr_array for context in contexts])
+
+
+def tile_windows(width: int, height: int, tile: int, overlap: float) -> List[Tuple[int, int, int, int]]:
+    """(left, top, right, bottom) of overlapping tiles covering the image; the last ones sit flush with the edges."""
+    step = max(1, int(tile * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile:
+            return [0]
+        return list(range(0, length - tile, step)) + [length - tile]
+
+    return [(left, top, min(left + tile, width), min(top + tile, height))
+            for top in starts(height) for left in starts(width)]
+
+
+def detect_windows(frame: np.ndarray, windows: List[tuple]) -> list:
+    """
+    Boxes found in windows of an RGB frame, in frame coordinates, from one predict call.
+    The windows are views, so no tile is copied before Ultralytics letterboxes it.
+    """
+    # Ultralytics reads numpy input as BGR
+    tiles = [frame[top:bottom, left:right, ::-1] for left, top, right, bottom in windows]
+    boxes = []
+    for (left, top, _, _), tile_boxes in zip(windows, detect_boxes_batch(tiles)):
+        boxes.extend((x1 + left, y1 + top, x2 + left, y2 + top, conf, name)
+                     for x1, y1, x2, y2, conf, name in tile_boxes)
+    return boxes
 
-    # Process the detection results
-    labeled_image = results[0].plot()
+
+def merge_boxes(boxes: list, iou_threshold: float) -> list:
+    """
+    Class-wise greedy NMS across overlapping windows. A kept box grows to cover the boxes it
+    suppresses, so an object split by a tile edge comes out whole.
+    """
+    merged = []
+    by_class = {}
+    for box in boxes:
+        by_class.setdefault(box[5], []).append(box)
+
+    for name, group in by_class.items():
+        array = np.array([box[:5] for box in group], dtype=np.float64)
+        areas = np.maximum((array[:, 2] - array[:, 0]) * (array[:, 3] - array[:, 1]), 1e-9)
+        order = array[:, 4].argsort()[::-1]
+        while order.size:
+            best, rest = order[0], order[1:]
+            width = np.minimum(array[best, 2], array[rest, 2]) - np.maximum(array[best, 0], array[rest, 0])
+            height = np.minimum(array[best, 3], array[rest, 3]) - np.maximum(array[best, 1], array[rest, 1])
+            intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+            iou = intersection / (areas[best] + areas[rest] - intersection)
+            fragment = intersection / np.minimum(areas[best], areas[rest])
+            suppressed = (iou >= iou_threshold) | (fragment >= FRAGMENT_OVERLAP)
+
+            covered = array[np.concatenate(([best], rest[suppressed]))]
+            merged.append((covered[:, 0].min(), covered[:, 1].min(), covered[:, 2].max(), covered[:, 3].max(),
+                           array[best, 4], name))
+            order = rest[~suppressed]
+    return merged
+
+
+async def run_tiled_detection(image: ImageContext) -> list:
+    """
+    Detection on a full-resolution decode: the whole frame (for objects larger than a tile) plus
+    overlapping YOLO_TILE_SIZE tiles, YOLO_TILE_BATCH per predict call with the calls running in
+    parallel, merged across tiles and returned in original-image coordinates.
+    """
+    windows = [(0, 0, image.width, image.height)] + tile_windows(
+        image.width, image.height, config.YOLO_TILE_SIZE, config.YOLO_TILE_OVERLAP
+    )
+    # An image no larger than one tile would otherwise be scanned twice
+    windows = list(dict.fromkeys(windows))
+    chunk = max(1, config.YOLO_TILE_BATCH)
+    chunks = [windows[i:i + chunk] for i in range(0, len(windows), chunk)]
+
+    if inference_pool.enabled():
+        chunk_boxes = await inference_pool.detect_windows(image, chunks)
+    else:
+        frame = await executor.run_blocking("encode", lambda: image.rgb_array)
+        chunk_boxes = await asyncio.gather(*[
+            executor.run_blocking("yolo", detect_windows, frame, windows) for windows in chunks
+        ])
+
+    boxes = [box for boxes in chunk_boxes for box in boxes]
+    return detection_list_from_boxes(merge_boxes(boxes, config.YOLO_TILE_NMS_IOU))
+
+
+def get_batcher(size: int = 0):
+    size = size or config.YOLO_BATCH_SIZE
+    if size not in _batchers:
+        _batchers[size] = batching.MicroBatcher("yolo", run_detection_batch, size, config.YOLO_BATCH_WAIT_MS)
+    return _batchers[size]
+
+
+async def close_batchers():
+    for batcher in _batchers.values():
+        await batcher.close()
+
+
+def detect_objects(image: Image):
+    return detect_objects_batch([image])[0]
+
+
+def predict_batch(images: list):
+    # Perform object detection on all input images in a single call
+    yolo_model = checkout_model()
+    try:
+        return yolo_model.predict(images)
+    finally:
+        release_model(yolo_model)
+
+
+def detect_objects_batch(images: List[Image.Image]):
+    return [build_detection_list(result) for result in predict_batch(images)]
+
+
+def detect_boxes_batch(images: list) -> List[list]:
+    return [extract_boxes(result) for result in predict_batch(images)]
+
+
+def extract_boxes(result) -> list:
+    """(x1, y1, x2, y2, confidence, class name) of each box in an Ultralytics result."""
+    return [(x1, y1, x2, y2, conf, result.names[int(cls)]) for x1, y1, x2, y2, conf, cls in result.boxes.data.tolist()]
+
+
+def build_detection_list(result):
+    # Only the boxes are needed; an annotated overlay is rendered on request by utils.pipeline.annotate
+    return detection_list_from_boxes(extract_boxes(result))
+
+
+def detection_list_from_boxes(boxes: list):
     detected_objects = {}
 
     # Iterate through detected objects
-    for result in results[0].boxes.data:
-        x1, y1, x2, y2, conf, cls = result
-        class_name = model.names[int(cls)]
-
+    for x1, y1, x2, y2, conf, class_name in boxes:
         # Calculate width and height from bounding box coordinates
         width = int(x2) - int(x1)
         height = int(y2) - int(y1)
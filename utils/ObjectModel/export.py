@@ -0,0 +1,63 @@
+"""
+Export best.pt for the CPU inference runtimes.
+
+    python -m utils.ObjectModel.export --format onnx                  # best.onnx (ONNX Runtime)
+    python -m utils.ObjectModel.export --format onnx --int8           # best.int8.onnx
+    python -m utils.ObjectModel.export --format openvino              # best_openvino_model/
+    python -m utils.ObjectModel.export --format openvino --int8 --data dataset.yaml
+
+Point YOLO_WEIGHTS at the printed path, after checking it with utils.ObjectModel.parity.
+ONNX int8 uses dynamic (weight-only) quantization and needs no data. OpenVINO int8 uses NNCF
+post-training quantization, calibrated on the images of an Ultralytics dataset YAML.
+The runtimes are optional and not in requirements.txt: onnx and onnxruntime, or openvino (plus
+nncf for int8).
+"""
+import argparse
+
+from utils.ObjectModel import detect
+
+
+def quantize_onnx(path: str) -> str:
+    """Dynamically quantize an exported ONNX model to int8, keeping the Ultralytics metadata."""
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized = path[:-len(".onnx")] + ".int8.onnx"
+    quantize_dynamic(path, quantized, weight_type=QuantType.QUInt8)
+
+    # Class names and the input size live in metadata_props; without them every class is "classN"
+    source, target = onnx.load(path), onnx.load(quantized)
+    if not target.metadata_props:
+        target.metadata_props.extend(source.metadata_props)
+        onnx.save(target, quantized)
+    return quantized
+
+
+def export(fmt: str, int8: bool = False, data: str = None, imgsz: int = 640) -> str:
+    """Export detect.MODEL_PATH and return the path to load with YOLO_WEIGHTS."""
+    from ultralytics import YOLO
+
+    model = YOLO(detect.MODEL_PATH)
+    if fmt == "onnx":
+        # Dynamic axes, so micro-batches and the letterboxed shapes of any image are accepted
+        path = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        return quantize_onnx(path) if int8 else path
+    if fmt == "openvino":
+        if int8 and not data:
+            raise ValueError("OpenVINO int8 needs --data, a dataset YAML whose images calibrate the quantization")
+        return model.export(format="openvino", imgsz=imgsz, dynamic=True, int8=int8, data=data)
+    raise ValueError(f"Unknown export format: {fmt}; choose onnx or openvino")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    parser.add_argument("--int8", action="store_true", help="quantize the weights to int8")
+    parser.add_argument("--data", help="dataset YAML for OpenVINO int8 calibration")
+    parser.add_argument("--imgsz", type=int, default=640)
+    args = parser.parse_args()
+    print(export(args.format, args.int8, args.data, args.imgsz))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Accuracy and latency parity of an exported YOLO model against best.pt.
+
+    python -m utils.ObjectModel.parity utils/ObjectModel/best.int8.onnx --images path/to/validation
+
+Both models see the same images and go through detect.build_detection_list, so the detection_list
+format is checked too. best.pt's detections are the reference: a candidate box matches when it has
+the same class and IoU >= --iou. Reports recall, precision and mean IoU of the matches, and the
+per-image latency of both models. Exits 1 when recall drops below --min-recall.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from utils.ObjectModel import detect
+from utils.pipeline.image_context import ImageContext
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def load_images(directory: str) -> List[Tuple[str, ImageContext]]:
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(directory, name), "rb") as f:
+                images.append((name, ImageContext.from_bytes(f.read())))
+    return images
+
+
+def boxes_by_class(detection_list: list) -> Dict[str, List[tuple]]:
+    return {
+        entry["object"]: [(c["x"], c["y"], c["x"] + c["width"], c["y"] + c["height"]) for c in entry["coordinates"]]
+        for entry in detection_list
+    }
+
+
+def iou(a: tuple, b: tuple) -> float:
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union else 0.0
+
+
+def match(reference: list, candidate: list, threshold: float) -> Tuple[int, int, int, List[float]]:
+    """Greedy same-class matching by IoU: (reference boxes, candidate boxes, matches, matched IoUs)."""
+    reference, candidate = boxes_by_class(reference), boxes_by_class(candidate)
+    matched_ious = []
+    for name, reference_boxes in reference.items():
+        unmatched = list(candidate.get(name, []))
+        for box in reference_boxes:
+            scores = [iou(box, other) for other in unmatched]
+            if scores and max(scores) >= threshold:
+                best = scores.index(max(scores))
+                matched_ious.append(scores[best])
+                unmatched.pop(best)
+    return (sum(map(len, reference.values())), sum(map(len, candidate.values())),
+            len(matched_ious), matched_ious)
+
+
+def predict_timed(model, images: List[Tuple[str, ImageContext]]) -> Tuple[List[list], List[float]]:
+    """detection_list and latency (ms) per image, after one untimed warm-up call."""
+    model.predict(images[0][1].bgr_array, verbose=False)
+    detections, latencies = [], []
+    for _, context in images:
+        start = time.perf_counter()
+        result = model.predict(context.bgr_array, verbose=False)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        detections.append(detect.build_detection_list(result))
+    return detections, latencies
+
+
+def latency_summary(latencies: List[float]) -> str:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"mean {statistics.mean(ordered):.1f} ms, p50 {statistics.median(ordered):.1f} ms, p95 {p95:.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("weights", help="exported model to check, e.g. utils/ObjectModel/best.onnx")
+    parser.add_argument("--images", default="utils/faceDetect/images", help="directory of validation images")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for a candidate box to match the reference")
+    parser.add_argument("--min-recall", type=float, default=0.0, help="fail below this recall (0 = report only)")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        sys.exit(f"No images in {args.images}")
+
+    reference, reference_ms = predict_timed(detect.load_model(detect.MODEL_PATH), images)
+    candidate, candidate_ms = predict_timed(detect.load_model(args.weights), images)
+
+    totals = [0, 0, 0]
+    matched_ious = []
+    for (name, _), expected, actual in zip(images, reference, candidate):
+        reference_count, candidate_count, matches, ious = match(expected, actual, args.iou)
+        totals = [totals[0] + reference_count, totals[1] + candidate_count, totals[2] + matches]
+        matched_ious.extend(ious)
+        if matches != reference_count or matches != candidate_count:
+            print(f"{name}: {reference_count} reference boxes, {candidate_count} candidate, {matches} matched")
+
+    reference_count, candidate_count, matches = totals
+    recall = matches / reference_count if reference_count else 1.0
+    precision = matches / candidate_count if candidate_count else 1.0
+    print(f"{len(images)} images, {reference_count} reference boxes")
+    print(f"recall {recall:.3f}, precision {precision:.3f}, "
+          f"mean IoU {statistics.mean(matched_ious) if matched_ious else 0.0:.3f}")
+    print(f"{detect.MODEL_PATH}: {latency_summary(reference_ms)}")
+    print(f"{args.weights}: {latency_summary(candidate_ms)}")
+    print(f"speed-up {statistics.mean(reference_ms) / statistics.mean(candidate_ms):.2f}x")
+
+    if recall < args.min_recall:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# DCT-II basis for the 32x32 pHash input
+_DCT_SIZE = 32
+_DCT = np.cos(np.pi * np.outer(np.arange(_DCT_SIZE), 2 * np.arange(_DCT_SIZE) + 1) / (2 * _DCT_SIZE))
+
+
+def _small_gray(image: Image.Image, size: Tuple[int, int]) -> np.ndarray:
+    """Downscale first (reduce() does most of the work) and only then convert to grayscale."""
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    small = image.resize(size, Image.Resampling.BILINEAR, reducing_gap=3.0)
+    return np.asarray(small.convert("L"), dtype=np.float64)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8)).tobytes(), "big")
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash: sign of the horizontal gradient on a 9x8 thumbnail."""
+    pixels = _small_gray(image, (9, 8))
+    return _bits_to_int((pixels[:, 1:] > pixels[:, :-1]).flatten())
+
+
+def phash(image: Image.Image) -> int:
+    """64-bit perceptual hash: low-frequency DCT coefficients compared against their median."""
+    pixels = _small_gray(image, (_DCT_SIZE, _DCT_SIZE))
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8].flatten()
+    # The DC term only tracks overall brightness, so leave it out of the median
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+HASHES = {"phash": phash, "dhash": dhash}
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes for Hamming-radius searches."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, hash_value: int, value: Any):
+        node = [hash_value, value, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(hash_value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, hash_value: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """All stored values within max_distance, nearest first."""
+        if self.root is None:
+            return []
+        matches = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(hash_value, node[0])
+            if distance <= max_distance:
+                matches.append((distance, node[1]))
+            # Triangle inequality: only children in [d - r, d + r] can hold matches
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+class NearDuplicateIndex:
+    """
+    Perceptual-hash index of recently analysed images.
+    Holds at most max_entries; the tree is rebuilt from the newest entries when it overflows.
+    """
+
+    def __init__(self, algorithm: str, max_distance: int, max_entries: int):
+        if algorithm not in HASHES:
+            raise ValueError(f"Unknown perceptual hash: {algorithm}")
+        self.hash_image = HASHES[algorithm]
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._entries = deque()
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+        self.stats = {"hashes": 0, "hash_ms": 0.0, "lookups": 0, "lookup_ms": 0.0, "matches": 0}
+
+    def compute(self, image: Image.Image) -> int:
+        start = time.perf_counter()
+        hash_value = self.hash_image(image)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.stats["hashes"] += 1
+            self.stats["hash_ms"] += elapsed_ms
+        return hash_value
+
+    def lookup(self, hash_value: int) -> Optional[Tuple[int, Any]]:
+        """Nearest indexed entry within the match threshold, as (distance, value)."""
+        start = time.perf_counter()
+        with self._lock:
+            matches = self._tree.search(hash_value, self.max_distance)
+            self.stats["lookups"] += 1
+            self.stats["lookup_ms"] += (time.perf_counter() - start) * 1000
+            if matches:
+                self.stats["matches"] += 1
+        return matches[0] if matches else None
+
+    def add(self, hash_value: int, value: Any):
+        with self._lock:
+            self._entries.append((hash_value, value))
+            self._tree.add(hash_value, value)
+            # Rebuild with some headroom so the cost is amortised over many inserts
+            if len(self._entries) > self.max_entries * 1.25:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popleft()
+                self._tree = BKTree()
+                for entry_hash, entry_value in self._entries:
+                    self._tree.add(entry_hash, entry_value)
+
+    def summary(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        stats["avg_hash_ms"] = stats["hash_ms"] / stats["hashes"] if stats["hashes"] else 0.0
+        stats["avg_lookup_ms"] = stats["lookup_ms"] / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+
+near_duplicates = NearDuplicateIndex(config.PHASH_ALGORITHM, config.PHASH_MAX_DISTANCE, config.PHASH_MAX_ENTRIES)
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from config import config
+from utils.pipeline import executor
+
+logger = logging.getLogger(__name__)
+
+# Returned by get() on a miss, since None is a valid cached result
+MISS = object()
+
+
+class Uncached:
+    """
+    Wraps an analyzer result that is returned to the caller but never cached, such as the
+    fallback verdict of a failed API call.
+    """
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+def content_digest(data: bytes) -> str:
+    """SHA-256 of the uploaded bytes, the content address every cached result hangs off."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(digest: str, analyzer: str, version: str) -> str:
+    """Key for one analyzer's result; bumping the analyzer version invalidates old entries."""
+    return f"{digest}:{analyzer}:{version}"
+
+
+class MemoryTier:
+    """LRU of serialized results, bounded by the total size of the stored JSON."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: str):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = payload
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class DiskTier:
+    """One JSON file per result, sharded by key prefix so directories stay small."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, name[:2], f"{name}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, payload: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+class ResultCache:
+    """
+    Two-tier cache of analyzer results: an in-memory LRU in front of an optional on-disk store.
+    Results are stored as JSON so callers always get a fresh copy they are free to mutate.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None):
+        self.memory = MemoryTier(max_bytes)
+        self.disk = DiskTier(disk_dir) if disk_dir else None
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Any:
+        payload = self.memory.get(key)
+        if payload is None and self.disk is not None:
+            try:
+                payload = await executor.run_blocking("cache", self.disk.get, key)
+            except Exception as e:
+                logger.error(f"Result cache disk read failed: {str(e)}")
+            if payload is not None:
+                self.memory.set(key, payload)
+
+        if payload is None:
+            self.misses += 1
+            return MISS
+        self.hits += 1
+        return json.loads(payload)
+
+    async def set(self, key: str, value: Any):
+        try:
+            payload = json.dumps(value, default=str)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Result for {key} is not cacheable: {str(e)}")
+            return
+
+        self.memory.set(key, payload)
+        if self.disk is not None:
+            try:
+                await executor.run_blocking("cache", self.disk.set, key, payload)
+            except Exception as e:
+                logger.error(f"Result cache disk write failed: {str(e)}")
+
+
+result_cache = ResultCache(config.RESULT_CACHE_MAX_BYTES, config.RESULT_CACHE_DIR)
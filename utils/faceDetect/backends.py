@@ -0,0 +1,124 @@
+import threading
+from typing import List
+
+import numpy as np
+
+from config import config
+
+
+class FaceBackend:
+    """
+    A face detector behind face_detection.process_image. detect() takes an RGB frame and returns
+    MTCNN-style detections ({"box": [x, y, w, h], "confidence": c}); thresholds are applied later.
+    """
+
+    name = ""
+
+    def detect(self, rgb_image: np.ndarray) -> List[dict]:
+        raise NotImplementedError
+
+    def detect_batch(self, rgb_images: List[np.ndarray]) -> List[List[dict]]:
+        return [self.detect(rgb_image) for rgb_image in rgb_images]
+
+
+class MTCNNBackend(FaceBackend):
+    """MTCNN on TensorFlow: the most thorough detector, and the slowest and heaviest to import."""
+
+    name = "mtcnn"
+
+    def __init__(self):
+        from mtcnn import MTCNN
+        self.detector = MTCNN()
+
+    def detect(self, rgb_image: np.ndarray) -> List[dict]:
+        return self.detector.detect_faces(rgb_image)
+
+    def detect_batch(self, rgb_images: List[np.ndarray]) -> List[List[dict]]:
+        # A list input makes MTCNN stack the images and return one detection list per image
+        return self.detector.detect_faces(rgb_images)
+
+
+class _PerThreadBackend(FaceBackend):
+    """OpenCV detectors keep per-call state, so every pool thread gets its own instance."""
+
+    def __init__(self):
+        self._local = threading.local()
+        # Load once up front, so a missing model file fails at startup rather than on a request
+        self._model()
+
+    def _create(self):
+        raise NotImplementedError
+
+    def _model(self):
+        model = getattr(self._local, "model", None)
+        if model is None:
+            model = self._local.model = self._create()
+        return model
+
+
+class YuNetBackend(_PerThreadBackend):
+    """OpenCV's YuNet (cv2.FaceDetectorYN): a few milliseconds per image on CPU, no TensorFlow."""
+
+    name = "yunet"
+
+    def _create(self):
+        import cv2
+        return cv2.FaceDetectorYN.create(config.FACE_YUNET_MODEL, "", (320, 320), config.FACE_MIN_SCORE, 0.3, 5000)
+
+    def detect(self, rgb_image: np.ndarray) -> List[dict]:
+        detector = self._model()
+        height, width = rgb_image.shape[:2]
+        detector.setInputSize((width, height))
+        # YuNet reads BGR
+        _, faces = detector.detect(np.ascontiguousarray(rgb_image[..., ::-1]))
+        if faces is None:
+            return []
+        return [{"box": [int(x), int(y), int(w), int(h)], "confidence": float(score)}
+                for x, y, w, h, score in faces[:, [0, 1, 2, 3, 14]]]
+
+
+def ssd_blob(rgb_image: np.ndarray) -> np.ndarray:
+    """
+    The SSD's input: 300x300 BGR minus the per-channel (B, G, R) training means. blobFromImage
+    subtracts the mean after swapRB, so the means are given in BGR order.
+    """
+    import cv2
+    return cv2.dnn.blobFromImage(cv2.resize(rgb_image, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0),
+                                 swapRB=True)
+
+
+class SSDBackend(_PerThreadBackend):
+    """OpenCV DNN ResNet-10 SSD (deploy.prototxt + res10 caffemodel): fast, weaker on small faces."""
+
+    name = "ssd"
+
+    def _create(self):
+        import cv2
+        return cv2.dnn.readNetFromCaffe(config.FACE_SSD_CONFIG, config.FACE_SSD_MODEL)
+
+    def detect(self, rgb_image: np.ndarray) -> List[dict]:
+        net = self._model()
+        height, width = rgb_image.shape[:2]
+        net.setInput(ssd_blob(rgb_image))
+        output = net.forward()[0, 0]
+
+        faces = []
+        for confidence, x1, y1, x2, y2 in output[:, 2:7]:
+            if confidence < config.FACE_MIN_SCORE:
+                continue
+            left, top = max(0, int(x1 * width)), max(0, int(y1 * height))
+            right, bottom = min(width, int(x2 * width)), min(height, int(y2 * height))
+            if right > left and bottom > top:
+                faces.append({"box": [left, top, right - left, bottom - top], "confidence": float(confidence)})
+        return faces
+
+
+BACKENDS = {backend.name: backend for backend in [MTCNNBackend, YuNetBackend, SSDBackend]}
+
+
+def create_backend(name: str = None) -> FaceBackend:
+    """Backend selected by FACE_BACKEND (or name)."""
+    name = name or config.FACE_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown face backend: {name}; choose from {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
@@ -0,0 +1,113 @@
+"""
+Compare the face detection backends on a directory of images.
+
+    python -m utils.faceDetect.compare_backends --images utils/faceDetect/images
+    python -m utils.faceDetect.compare_backends --backends mtcnn,yunet --threshold 0.9
+
+For every backend reports the model load time, the per-image latency and the number of faces at
+--threshold. There is no ground truth, so the first backend (MTCNN by default) is the reference:
+a face of another backend matches when its IoU with a reference face is >= --iou. A backend whose
+framework or model file is missing is skipped with a message.
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from utils.faceDetect.backends import BACKENDS, create_backend
+from utils.ObjectModel.parity import iou, latency_summary
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".avif")
+
+
+def load_images(directory: str) -> List[Tuple[str, np.ndarray]]:
+    """RGB frames of the images PIL can open; the others are skipped."""
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        try:
+            with Image.open(os.path.join(directory, name)) as image:
+                images.append((name, np.asarray(image.convert("RGB"))))
+        except OSError as e:
+            print(f"Skipping {name}: {e}")
+    return images
+
+
+def corners(faces: list) -> List[tuple]:
+    return [(x, y, x + w, y + h) for x, y, w, h in (face["box"] for face in faces)]
+
+
+def match(reference: list, candidate: list, threshold: float) -> int:
+    """Greedy IoU matching of two face lists; returns the number of matches."""
+    unmatched = corners(candidate)
+    matches = 0
+    for box in corners(reference):
+        scores = [iou(box, other) for other in unmatched]
+        if scores and max(scores) >= threshold:
+            unmatched.pop(scores.index(max(scores)))
+            matches += 1
+    return matches
+
+
+def run_backend(name: str, images: List[Tuple[str, np.ndarray]], threshold: float):
+    """(load seconds, faces per image, latency ms per image), after one untimed warm-up call."""
+    start = time.perf_counter()
+    backend = create_backend(name)
+    load_s = time.perf_counter() - start
+
+    backend.detect(images[0][1])
+    faces, latencies = [], []
+    for _, frame in images:
+        start = time.perf_counter()
+        detections = backend.detect(frame)
+        latencies.append((time.perf_counter() - start) * 1000)
+        faces.append([face for face in detections if face["confidence"] >= threshold])
+    return load_s, faces, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="utils/faceDetect/images", help="directory of images")
+    parser.add_argument("--backends", default=",".join(BACKENDS),
+                        help="comma-separated backends; the first one is the reference")
+    parser.add_argument("--threshold", type=float, default=0.9, help="confidence a face needs to count")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for a face to match the reference")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        sys.exit(f"No readable images in {args.images}")
+
+    results = {}
+    for name in [name for name in args.backends.split(",") if name]:
+        try:
+            results[name] = run_backend(name, images, args.threshold)
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+    if not results:
+        sys.exit("No backend could be loaded")
+
+    reference_name = next(iter(results))
+    reference_faces = results[reference_name][1]
+    reference_count = sum(map(len, reference_faces))
+    print(f"{len(images)} images, threshold {args.threshold}, reference {reference_name} "
+          f"({reference_count} faces)")
+    for name, (load_s, faces, latencies) in results.items():
+        count = sum(map(len, faces))
+        matches = sum(match(expected, actual, args.iou) for expected, actual in zip(reference_faces, faces))
+        recall = matches / reference_count if reference_count else 1.0
+        precision = matches / count if count else 1.0
+        print(f"{name}: load {load_s:.2f} s, {latency_summary(latencies)}, {count} faces, "
+              f"recall {recall:.3f}, precision {precision:.3f} vs {reference_name}")
+        for (image_name, _), expected, actual in zip(images, reference_faces, faces):
+            if len(expected) != len(actual):
+                print(f"  {image_name}: {len(actual)} faces ({len(expected)} from {reference_name})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,20 @@
 from http.client import HTTPException
-import cv2
+import asyncio
+import logging
+import threading
 import numpy as np
-from mtcnn import MTCNN
 from fastapi import UploadFile, HTTPException
 from typing import List
 from PIL import Image
 
+from config import config
+from utils.faceDetect.backends import FaceBackend, create_backend
+from utils.pipeline import batching, executor, inference_pool
+from utils.pipeline.coordinates import scale_box, scale_detections
+from utils.pipeline.image_context import ImageContext
+
+logger = logging.getLogger(__name__)
+
 def decode_image(image) -> np.ndarray:
     """
     Convert various image inputs to numpy array format required by OpenCV.
@@ -13,9 +22,13 @@ def decode_image(image) -> np.ndarray:
     try:
         if isinstance(image, np.ndarray):
             return image
+        elif isinstance(image, ImageContext):
+            # Shared BGR view of the request's decoded frame, no extra conversion
+            return image.bgr_array
         elif isinstance(image, Image.Image):
             return np.array(image)
         elif isinstance(image, bytes):
+            import cv2
             nparr = np.frombuffer(image, np.uint8)
             return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         else:
@@ -23,73 +36,273 @@ def decode_image(image) -> np.ndarray:
     except Exception as e:
         raise ValueError(f"Error decoding image: {str(e)}")
 
-def detect_faces_mtcnn(image: np.ndarray, confidence_threshold=0.9):
+# Bump whenever the detector or the result format changes so cached results are not reused
+ANALYZER_VERSION = "2" if config.FACE_BACKEND == "mtcnn" else f"2-{config.FACE_BACKEND}"
+
+# One FACE_BACKEND detector per process, built on first use and reused by every call.
+# The backends import their frameworks (TensorFlow for MTCNN, cv2) only when built.
+_detector = None
+_detector_lock = threading.Lock()
+
+# Created lazily so they bind to the running event loop; one per batch size in use
+_batchers = {}
+
+def get_detector() -> FaceBackend:
+    """
+    Return this process's face detector (FACE_BACKEND), loading its model only once.
+    """
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = create_backend()
+    return _detector
+
+def filter_faces(detections: list, confidence_threshold: float) -> list:
     """
-    Detect faces using MTCNN and annotate the image.
+    Keep detections above the threshold as face boxes. Nothing is drawn here; an annotated
+    overlay is rendered on request by utils.pipeline.annotate.
+    """
+    # List to store face information
+    faces = []
+    
+    # Process each detection
+    for detection in detections:
+        if detection['confidence'] > confidence_threshold:
+            x, y, w, h = detection['box']
+            faces.append({
+                'x': int(x),
+                'y': int(y),
+                'width': int(w),
+                'height': int(h)
+            })
+    
+    return faces
+
+def to_rgb_array(image) -> np.ndarray:
+    """
+    The RGB frame the detectors take. An ImageContext already holds one, so it is used as is.
+    """
+    if isinstance(image, ImageContext):
+        return image.rgb_array
+    import cv2
+    # OpenCV input is BGR
+    return cv2.cvtColor(decode_image(image), cv2.COLOR_BGR2RGB)
+
+def detect_faces(image: np.ndarray, confidence_threshold=0.9, detector: FaceBackend = None) -> list:
+    """
+    Detect faces with the configured backend and return their boxes.
     """
     try:
-        # Ensure image is in numpy array format
-        image = decode_image(image)
+        # The detector only reads the frame, so no copy of it is made
+        rgb_image = to_rgb_array(image)
         
-        # Create a copy of the image to avoid modifying the original
-        image_copy = image.copy()
+        # Reuse the cached detector
+        if detector is None:
+            detector = get_detector()
         
-        # Initialize MTCNN detector
-        detector = MTCNN()
+        # Detect faces
+        detections = detector.detect(rgb_image)
         
-        # Convert BGR to RGB (MTCNN uses RGB)
-        rgb_image = cv2.cvtColor(image_copy, cv2.COLOR_BGR2RGB)
+        return filter_faces(detections, confidence_threshold)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error detecting faces: {str(e)}")
+
+def detect_faces_batch(images: list, confidence_threshold=0.9, detector: FaceBackend = None) -> list:
+    """
+    Detect faces in several images, with a single forward pass where the backend supports it.
+    Returns one list of face boxes per input image.
+    """
+    try:
+        rgb_images = [to_rgb_array(image) for image in images]
         
-        # Detect faces
-        detections = detector.detect_faces(rgb_image)
+        if detector is None:
+            detector = get_detector()
         
-        # List to store face information
-        faces = []
+        batch_detections = detector.detect_batch(rgb_images)
         
-        # Process each detection
-        for detection in detections:
-            confidence = detection['confidence']
-            if confidence > confidence_threshold:
-                x, y, w, h = detection['box']
-                faces.append({
-                    'x': int(x),
-                    'y': int(y),
-                    'width': int(w),
-                    'height': int(h)
-                })
-                # Draw rectangle around face
-                cv2.rectangle(image_copy, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                # Add confidence score
-                text = f"{confidence * 100:.2f}%"
-                cv2.putText(image_copy, text, (x, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 0), 2)
+        return [filter_faces(detections, confidence_threshold) for detections in batch_detections]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error detecting faces: {str(e)}")
+
+def best_threshold(detections: list, confidence_thresholds: List[float]):
+    """
+    Evaluate every threshold against one set of raw detections. Returns the faces of the threshold
+    that keeps the most (the first of equal ones, None if none keeps a face) and the face count
+    per threshold, keyed by the threshold as a string so it survives a JSON round trip.
+    The detections do not depend on the threshold, so the detector runs once.
+    """
+    scores = np.array([detection['confidence'] for detection in detections], dtype=np.float64)
+    thresholds = np.asarray(confidence_thresholds, dtype=np.float64)
+    # thresholds x detections comparison, summed per threshold
+    counts = (scores[np.newaxis, :] > thresholds[:, np.newaxis]).sum(axis=1)
+    threshold_counts = {str(threshold): int(count) for threshold, count in zip(confidence_thresholds, counts)}
+    
+    if not counts.size or counts.max() == 0:
+        return None, threshold_counts
+    return filter_faces(detections, confidence_thresholds[int(counts.argmax())]), threshold_counts
+
+def find_best_faces(image: np.ndarray, confidence_thresholds: List[float], detector: FaceBackend = None):
+    """
+    Run face detection once and keep the confidence threshold that finds the most faces.
+    Returns (faces, face count per threshold); faces is None when no threshold finds a face.
+    """
+    return find_best_faces_batch([image], confidence_thresholds, detector)[0]
+
+def find_best_faces_batch(images: list, confidence_thresholds: List[float], detector: FaceBackend = None):
+    """
+    Batched version of find_best_faces: a single forward pass covers every image and threshold.
+    """
+    try:
+        rgb_images = [to_rgb_array(image) for image in images]
         
-        return image_copy, faces
+        if detector is None:
+            detector = get_detector()
+        
+        batch_detections = detector.detect_batch(rgb_images)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error detecting faces: {str(e)}")
+    
+    best_results = []
+    for detections in batch_detections:
+        best_result, threshold_counts = best_threshold(detections, confidence_thresholds)
+        logger.debug(f"Faces per confidence threshold: {threshold_counts}")
+        best_results.append((best_result, threshold_counts))
+    
+    return best_results
+
+async def run_face_batch(items: list) -> list:
+    """
+    Run queued (image, confidence_thresholds) items, one batched pass per distinct threshold list.
+    """
+    groups = {}
+    for i, (_, confidence_thresholds) in enumerate(items):
+        groups.setdefault(tuple(confidence_thresholds), []).append(i)
+    
+    results = [None] * len(items)
+    for confidence_thresholds, indices in groups.items():
+        images = [items[i][0] for i in indices]
+        if inference_pool.enabled():
+            batch_results = await inference_pool.find_best_faces_batch(images, list(confidence_thresholds))
+        else:
+            batch_results = await executor.run_blocking("faces", find_best_faces_batch, images, list(confidence_thresholds))
+        for i, best_result in zip(indices, batch_results):
+            results[i] = best_result
+    
+    return results
+
+def get_batcher(size: int = 0) -> batching.MicroBatcher:
+    size = size or config.FACE_BATCH_SIZE
+    if size not in _batchers:
+        _batchers[size] = batching.MicroBatcher("faces", run_face_batch, size, config.FACE_BATCH_WAIT_MS)
+    return _batchers[size]
+
+async def close_batchers():
+    for batcher in _batchers.values():
+        await batcher.close()
+
+async def detect_best_faces(image, confidence_thresholds: List[float]):
+    """
+    Run the blocking detector passes batched, on the inference workers or on the bounded face pool.
+    """
+    batch_size = batching.batch_size(config.FACE_BATCH_SIZE)
+    if batch_size > 1:
+        return await get_batcher(batch_size).submit((image, confidence_thresholds))
+    if inference_pool.enabled():
+        return await inference_pool.find_best_faces(image, confidence_thresholds)
+    return await executor.run_blocking("faces", find_best_faces, image, confidence_thresholds)
+
+def crop_regions(image: ImageContext, regions: list, padding: float = 0.1) -> list:
+    """
+    Crop padded regions (original-image boxes) out of the face-resolution decode.
+    Returns (crop context, (left, top) in the reduced image) pairs.
+    """
+    reduced = image.reduced(config.FACE_DECODE_MAX_SIDE)
+    scale_x, scale_y = reduced.scale
+    crops = []
+    for box in regions:
+        pad_x, pad_y = box["width"] * padding, box["height"] * padding
+        left = max(0, int((box["x"] - pad_x) / scale_x))
+        top = max(0, int((box["y"] - pad_y) / scale_y))
+        right = min(reduced.width, int((box["x"] + box["width"] + pad_x) / scale_x))
+        bottom = min(reduced.height, int((box["y"] + box["height"] + pad_y) / scale_y))
+        if right - left > 1 and bottom - top > 1:
+            crops.append((ImageContext(reduced.rgb.crop((left, top, right, bottom)), scale=reduced.scale), (left, top)))
+    return crops
+
+def _overlaps(box: dict, other: dict, threshold: float = 0.5) -> bool:
+    width = min(box["x"] + box["width"], other["x"] + other["width"]) - max(box["x"], other["x"])
+    height = min(box["y"] + box["height"], other["y"] + other["height"]) - max(box["y"], other["y"])
+    if width <= 0 or height <= 0:
+        return False
+    intersection = width * height
+    union = box["width"] * box["height"] + other["width"] * other["height"] - intersection
+    return intersection / union > threshold
+
+async def process_person_regions(image, detections, confidence_thresholds: List[float] = [0.6]) -> dict:
+    """
+    Run face detection only inside the regions the object detector labelled as people, instead of over
+    the whole frame. Falls back to the whole frame if the detections are unavailable (failed or
+    timed out); returns no faces when there are no people.
+    """
+    if not isinstance(detections, list):
+        return await process_image(image, confidence_thresholds)
+
+    regions = [
+        box for detection in detections if detection.get("object") in config.FACE_REGION_LABELS
+        for box in detection.get("coordinates", [])
+    ]
+    if not regions:
+        return {}
+
+    image = ImageContext.wrap(image)
+    crops = await executor.run_blocking("encode", crop_regions, image, regions)
+    results = await asyncio.gather(*[detect_best_faces(crop, confidence_thresholds) for crop, _ in crops])
+
+    coordinates_data = []
+    # Counts are summed over the regions, before overlapping regions' duplicates are dropped
+    threshold_counts = {}
+    for (crop, (left, top)), (best_result, counts) in zip(crops, results):
+        for threshold, count in counts.items():
+            threshold_counts[threshold] = threshold_counts.get(threshold, 0) + count
+        if not best_result:
+            continue
+        for face in best_result:
+            box = scale_box({
+                'x': face['x'] + left,
+                'y': face['y'] + top,
+                'width': face['width'],
+                'height': face['height']
+            }, *crop.scale)
+            # Overlapping person boxes find the same face twice
+            if not any(_overlaps(box, kept) for kept in coordinates_data):
+                coordinates_data.append(box)
+
+    if not coordinates_data:
+        return {}
+    return {"object": "Face", "coordinates": coordinates_data, "threshold_counts": threshold_counts}
 
 async def process_image(image: np.ndarray, confidence_thresholds: List[float] = [0.6]) -> dict:
     """
-    Process an image to detect faces using multiple confidence thresholds.
+    Process an image to detect faces using multiple confidence thresholds. The Face result carries
+    the boxes of the best threshold and the face count per threshold (threshold_counts).
     If no faces are detected, return an empty response.
     """
     try:
-        # Initialize variables for the best result
-        max_faces = 0
-        best_result = None
+        # Share the decoded frame with the other analyzers of this request
+        if isinstance(image, Image.Image):
+            image = ImageContext(image)
         
-        # Try different confidence thresholds
-        for confidence in confidence_thresholds:
-            print(f"\nTrying confidence threshold: {confidence}")
-            annotated_image, detected_faces = detect_faces_mtcnn(image, confidence)
-            
-            # Update the best result if more faces are detected
-            if len(detected_faces) > max_faces:
-                max_faces = len(detected_faces)
-                best_result = (annotated_image, detected_faces)
+        # The detectors scale the frame themselves, so decode at a reduced size and map the boxes back
+        scale = (1.0, 1.0)
+        if isinstance(image, ImageContext):
+            image = await executor.run_blocking("encode", image.reduced, config.FACE_DECODE_MAX_SIDE)
+            scale = image.scale
+        
+        best_result, threshold_counts = await detect_best_faces(image, confidence_thresholds)
         
         if best_result:
-            annotated_image, detected_faces = best_result
+            detected_faces = best_result
             # Prepare the return data with only face coordinates in the requested format
             coordinates_data = [{
                 'x': face['x'],
@@ -98,10 +311,12 @@ async def process_image(image: np.ndarray, confidence_thresholds: List[float] =
                 'height': face['height']
             } for face in detected_faces]
             
-            return {
+            return scale_detections({
                 "object": "Face",
-                "coordinates": coordinates_data  # Returning only coordinates
-            }
+                "coordinates": coordinates_data,
+                # Faces found at each confidence threshold, from the same single detector pass
+                "threshold_counts": threshold_counts
+            }, *scale)
         else:
             # Return empty response if no faces are detected
             return {}
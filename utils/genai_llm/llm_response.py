@@ -3,10 +3,16 @@ import os
 from PIL import Image
 import json
 import logging
-from anthropic import Anthropic
+import httpx
+import threading
 from typing import Dict, Optional, Any
 import io
 import base64
+import hashlib
+
+from config import config
+from utils.pipeline import executor
+from utils.pipeline.image_context import ImageContext
 
 # Logging Configuration
 logging.basicConfig(
@@ -15,8 +21,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Claude API Client Configuration
-client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# Claude API Client Configuration, built on first use so workers without the LLM never import the SDK
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+                # The SDK's own timeout and retries must fit inside the analyzer deadline
+                _client = AsyncAnthropic(
+                    api_key=os.getenv("ANTHROPIC_API_KEY"),
+                    timeout=config.LLM_DEADLINE or config.HTTP_TIMEOUT,
+                    max_retries=0 if config.LLM_DEADLINE else 2,
+                    # Keep idle connections long enough for the warm-up's connection to still be there
+                    http_client=DefaultAsyncHttpxClient(
+                        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20,
+                                            keepalive_expiry=config.HTTP_KEEPALIVE),
+                    ),
+                )
+    return _client
+
+
+async def warm_up():
+    """Open the client's connection (DNS, TCP, TLS) before the first analysis needs it."""
+    from anthropic import APIError
+    try:
+        await get_client().with_options(max_retries=0, timeout=5).get("/v1/models", cast_to=httpx.Response)
+    except APIError:
+        pass  # Any answer, even 401/404, means the connection is up
 
 THREAT_PROMPT = """
 Analyze this image and provide a security assessment. Return a JSON object with this exact structure: if the description is of sexually explicit content, or showing blood or any sort of violence or human injury, set nsfw_content to true
@@ -50,6 +86,11 @@ if the image is of a crime scene or shows a deceased individual, set the value o
 }
 """
 
+LLM_MODEL = "claude-3-sonnet-20240229"
+
+# Model plus a fingerprint of the prompt, so editing either invalidates cached verdicts
+ANALYZER_VERSION = f"{LLM_MODEL}:{hashlib.sha256(THREAT_PROMPT.encode()).hexdigest()[:12]}"
+
 async def clean_json_text(text: str) -> Optional[str]:
     """Clean and format JSON text."""
     print("################### USING CLAUDE ################")
@@ -79,21 +120,22 @@ async def clean_json_text(text: str) -> Optional[str]:
         logger.error(f"Error in clean_json_text: {str(e)}")
         return None
 
+def encode_png_base64(image: Image.Image) -> str:
+    """Encode image as base64 PNG, reusing the request's memoized PNG bytes."""
+    return base64.b64encode(ImageContext.wrap(image).png_bytes()).decode('utf-8')
+
 async def analyze_image(image: Image.Image) -> Optional[Dict[str, Any]]:
     """Analyze image with Claude model and enhanced error handling."""
     try:
         logger.info("Starting image analysis")
 
-        # Convert image to base64
-        with io.BytesIO() as bio:
-            image.save(bio, format='PNG')
-            image_bytes = bio.getvalue()
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        # Convert image to base64 on the encode pool
+        base64_image = await executor.run_blocking("encode", encode_png_base64, image)
 
         # Call Claude API with image
         try:
-            response = client.messages.create(
-                model="claude-3-sonnet-20240229",
+            response = await get_client().messages.create(
+                model=LLM_MODEL,
                 max_tokens=1024,
                 temperature=0.1,
                 messages=[
@@ -190,9 +232,8 @@ async def llm_process(image: Image.Image) -> Optional[Dict]:
     try:
         logger.info("Starting LLM process")
         
-        # Ensure image is in RGB mode
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        # Claude downsizes anything above ~1568px itself, so never encode more pixels than that
+        image = await executor.run_blocking("encode", ImageContext.wrap(image).reduced, config.LLM_DECODE_MAX_SIDE)
         
         llm_response = await analyze_image(image)
         if not llm_response:
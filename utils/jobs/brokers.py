@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from config import config
+from utils.pipeline import executor
+
+logger = logging.getLogger(__name__)
+
+# Job states after which a job is never picked up again
+FINISHED = ("done", "failed")
+
+
+class MemoryBroker:
+    """
+    In-process queue. Jobs are lost on restart and only visible to the process that accepted
+    them, so use it with a single uvicorn worker.
+    """
+
+    def __init__(self):
+        self._queue = asyncio.Queue()
+        self._jobs = {}
+        self._data = {}
+
+    async def enqueue(self, job: dict, data: bytes):
+        self._prune()
+        self._jobs[job["id"]] = dict(job)
+        self._data[job["id"]] = data
+        await self._queue.put(job["id"])
+
+    async def claim(self, timeout: float) -> Optional[Tuple[dict, bytes]]:
+        """Next queued job and its payload, or None if nothing arrived within timeout seconds."""
+        try:
+            job_id = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return dict(self._jobs[job_id]), self._data.pop(job_id)
+
+    async def update(self, job: dict):
+        self._jobs[job["id"]] = dict(job)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def close(self):
+        pass
+
+    def _prune(self):
+        cutoff = time.time() - config.JOB_RESULT_TTL
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["status"] in FINISHED and job["updated"] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class SQLiteBroker:
+    """
+    Durable queue in a SQLite file. Queued jobs survive restarts and are shared by every worker
+    process on the host; all database access runs on the "jobs" pool.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, status TEXT NOT NULL, record TEXT NOT NULL, data BLOB,"
+                " created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, created)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must stay on the thread that opened them
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _enqueue(self, job: dict, data: bytes):
+        conn = self._connection()
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?",
+            (*FINISHED, time.time() - config.JOB_RESULT_TTL),
+        )
+        conn.execute(
+            "INSERT INTO jobs (id, status, record, data, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+            (job["id"], job["status"], json.dumps(job), data, job["created"], job["updated"]),
+        )
+
+    def _claim(self) -> Optional[Tuple[dict, bytes]]:
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front, so two processes cannot claim the same row
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, record, data FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                job = json.loads(row[1])
+                job["status"] = "running"
+                conn.execute(
+                    "UPDATE jobs SET status = ?, record = ?, updated = ? WHERE id = ?",
+                    (job["status"], json.dumps(job), time.time(), row[0]),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return (job, row[2]) if row is not None else None
+
+    def _update(self, job: dict):
+        # The payload is only needed until the job has run
+        data_clause = ", data = NULL" if job["status"] in FINISHED else ""
+        self._connection().execute(
+            f"UPDATE jobs SET status = ?, record = ?, updated = ?{data_clause} WHERE id = ?",
+            (job["status"], json.dumps(job, default=str), job["updated"], job["id"]),
+        )
+
+    def _get(self, job_id: str) -> Optional[dict]:
+        row = self._connection().execute("SELECT record FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    async def enqueue(self, job: dict, data: bytes):
+        await executor.run_blocking("jobs", self._enqueue, job, data)
+
+    async def claim(self, timeout: float) -> Optional[Tuple[dict, bytes]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            claimed = await executor.run_blocking("jobs", self._claim)
+            if claimed is not None or time.monotonic() >= deadline:
+                return claimed
+            await asyncio.sleep(config.JOB_POLL_INTERVAL)
+
+    async def update(self, job: dict):
+        await executor.run_blocking("jobs", self._update, job)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await executor.run_blocking("jobs", self._get, job_id)
+
+    async def close(self):
+        pass
+
+
+class RedisBroker:
+    """
+    Queue on any Redis-protocol server (Redis, Valkey, KeyDB, ...), shared across hosts.
+    A "fakeredis://" URL runs against the in-process fakeredis stand-in instead.
+    """
+
+    def __init__(self, url: str, prefix: str = "jobs"):
+        if url.startswith("fakeredis://"):
+            from fakeredis import aioredis as fakeredis
+            self.redis = fakeredis.FakeRedis()
+        else:
+            # Optional and imported here, so the other brokers never load it
+            try:
+                import redis.asyncio as aioredis
+            except ImportError:
+                raise RuntimeError("JOB_BROKER=redis needs the 'redis' package")
+            self.redis = aioredis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix, *parts))
+
+    async def enqueue(self, job: dict, data: bytes):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._key("job", job["id"]), json.dumps(job), ex=config.JOB_RESULT_TTL)
+            pipe.set(self._key("data", job["id"]), data, ex=config.JOB_RESULT_TTL)
+            pipe.lpush(self._key("queue"), job["id"])
+            await pipe.execute()
+
+    async def claim(self, timeout: float) -> Optional[Tuple[dict, bytes]]:
+        popped = await self.redis.brpop([self._key("queue")], timeout=max(1, int(timeout)))
+        if popped is None:
+            return None
+        job_id = popped[1].decode()
+        record, data = await self.redis.mget(self._key("job", job_id), self._key("data", job_id))
+        if record is None or data is None:
+            logger.warning(f"Job {job_id} expired before it was claimed")
+            return None
+        return json.loads(record), data
+
+    async def update(self, job: dict):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._key("job", job["id"]), json.dumps(job, default=str), ex=config.JOB_RESULT_TTL)
+            if job["status"] in FINISHED:
+                pipe.delete(self._key("data", job["id"]))
+            await pipe.execute()
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        record = await self.redis.get(self._key("job", job_id))
+        return json.loads(record) if record is not None else None
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_broker():
+    """Broker selected by JOB_BROKER; JOB_BROKER_URL is the SQLite path or the Redis URL."""
+    if config.JOB_BROKER == "memory":
+        return MemoryBroker()
+    if config.JOB_BROKER == "sqlite":
+        return SQLiteBroker(config.JOB_BROKER_URL)
+    if config.JOB_BROKER == "redis":
+        return RedisBroker(config.JOB_BROKER_URL)
+    raise ValueError(f"Unknown job broker: {config.JOB_BROKER}")
@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import config
+from utils.jobs.brokers import create_broker
+from utils.pipeline import executor
+
+logger = logging.getLogger(__name__)
+
+# Job kind -> coroutine taking (params, payload bytes) and returning a JSON-serialisable result
+JOB_HANDLERS: Dict[str, Callable[[dict, bytes], Awaitable[Any]]] = {}
+
+_broker = None
+_workers = []
+
+
+def register(kind: str, handler: Callable[[dict, bytes], Awaitable[Any]]):
+    JOB_HANDLERS[kind] = handler
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = create_broker()
+    return _broker
+
+
+async def check_callback_url(url: str) -> Optional[str]:
+    """
+    Raises ValueError unless url is an http(s) URL we may POST to: a host in
+    JOB_WEBHOOK_ALLOWED_HOSTS or, without an allow-list, one that resolves only to public addresses,
+    so callbacks cannot reach loopback, link-local (cloud metadata) or private-network services.
+    Returns the checked address to connect to, or None for an allow-listed host.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if config.JOB_WEBHOOK_ALLOWED_HOSTS:
+        if host not in config.JOB_WEBHOOK_ALLOWED_HOSTS:
+            raise ValueError(f"callback_url host {host} is not allowed")
+        return
+
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError):
+        raise ValueError(f"callback_url host {host} does not resolve")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"callback_url host {host} resolves to a non-public address")
+    return addresses[0][4][0]
+
+
+def pin_address(url: str, address: str):
+    """
+    (url, headers, extensions) that POST to url over a connection to address, the one
+    check_callback_url approved: resolving the name again would let a rebinding DNS server swap in
+    a private address after the check. The Host header and TLS SNI/certificate check keep the name.
+    """
+    parts = urlsplit(url)
+    host = f"[{address}]" if ":" in address else address
+    netloc = f"{host}:{parts.port}" if parts.port else host
+    headers = {"Host": f"{parts.hostname}:{parts.port}" if parts.port else parts.hostname}
+    extensions = {"sni_hostname": parts.hostname} if parts.scheme == "https" else {}
+    return parts._replace(netloc=netloc).geturl(), headers, extensions
+
+
+async def submit(kind: str, data: bytes, params: Optional[dict] = None, callback_url: Optional[str] = None) -> dict:
+    """Queue a job and return its record straight away; a worker picks it up later."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    if callback_url is not None:
+        await check_callback_url(callback_url)
+
+    now = time.time()
+    job = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": "queued",
+        "params": params or {},
+        "callback_url": callback_url,
+        "created": now,
+        "updated": now,
+        "result": None,
+        "error": None,
+    }
+    await get_broker().enqueue(job, data)
+    return job
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    return await get_broker().get(job_id)
+
+
+async def deliver_webhook(job: dict):
+    """POST the finished job to its callback URL, retrying server errors with backoff."""
+    try:
+        # Checked again at delivery: the name may resolve differently than at submission
+        address = await check_callback_url(job["callback_url"])
+    except ValueError as e:
+        logger.error(f"Not delivering webhook for job {job['id']}: {str(e)}")
+        return
+
+    url, headers, extensions = job["callback_url"], {}, {}
+    if address is not None:
+        url, headers, extensions = pin_address(url, address)
+    body = json.dumps(job, default=str).encode()
+    headers["Content-Type"] = "application/json"
+    if config.JOB_WEBHOOK_SECRET:
+        # Lets the receiver check the callback really came from us
+        signature = hmac.new(config.JOB_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        headers["X-Signature-SHA256"] = signature
+
+    for attempt in range(config.JOB_WEBHOOK_RETRIES):
+        try:
+            # No redirects: they would lead past check_callback_url
+            response = await executor.get_http_client().post(url, content=body, headers=headers,
+                                                             extensions=extensions, follow_redirects=False)
+            if response.status_code < 500:
+                if response.status_code >= 400:
+                    logger.warning(f"Webhook for job {job['id']} rejected with {response.status_code}")
+                return
+            logger.warning(f"Webhook for job {job['id']} failed with {response.status_code}")
+        except httpx.HTTPError as e:
+            logger.warning(f"Webhook for job {job['id']} failed: {str(e)}")
+        await asyncio.sleep(2 ** attempt)
+    logger.error(f"Giving up on webhook for job {job['id']}")
+
+
+async def run_job(job: dict, data: bytes):
+    broker = get_broker()
+    job["status"] = "running"
+    job["updated"] = time.time()
+    await broker.update(job)
+
+    try:
+        job["result"] = await JOB_HANDLERS[job["kind"]](job["params"], data)
+        job["status"] = "done"
+    except Exception as e:
+        logger.exception(f"Job {job['id']} ({job['kind']}) failed")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    job["updated"] = time.time()
+    await broker.update(job)
+
+    if job.get("callback_url"):
+        await deliver_webhook(job)
+
+
+async def _work(worker_id: int):
+    broker = get_broker()
+    while True:
+        try:
+            claimed = await broker.claim(timeout=1.0)
+            if claimed is not None:
+                await run_job(*claimed)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # A broker hiccup must not kill the worker
+            logger.exception(f"Job worker {worker_id} error")
+            await asyncio.sleep(1.0)
+
+
+def start(workers: int = None):
+    """Start the job workers on the running event loop."""
+    workers = config.JOB_WORKERS if workers is None else workers
+    for worker_id in range(workers):
+        _workers.append(asyncio.ensure_future(_work(worker_id)))
+    logger.info(f"Started {workers} job workers on the {config.JOB_BROKER} broker")
+
+
+async def stop():
+    """Stop the workers; jobs they were running stay "running" in durable brokers."""
+    global _broker
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    if _broker is not None:
+        await _broker.close()
+        _broker = None
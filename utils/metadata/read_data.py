@@ -1,7 +1,19 @@
 from PIL import Image
 from PIL.ExifTags import TAGS, GPSTAGS
 
+from utils.pipeline import executor
+from utils.pipeline.image_context import ImageContext
+
+# Bump whenever the extracted fields change so cached results are not reused
+ANALYZER_VERSION = "1"
+
 async def extract_sensitive_metadata(image: Image):
+    """
+    Extract sensitive metadata off the event loop on the metadata pool.
+    """
+    return await executor.run_blocking("metadata", read_sensitive_metadata, image)
+
+def read_sensitive_metadata(image: Image):
     """
     Extract sensitive metadata such as camera model, geolocation, user information (owner name, software), 
     and other technical details from an image, without aperture, ISO, or shutter speed.
@@ -11,8 +23,9 @@ async def extract_sensitive_metadata(image: Image):
         d, m, s = value
         return d + (m / 60.0) + (s / 3600.0)
 
-    exifdata = image._getexif()
-    if exifdata is None:
+    # EXIF lives on the original image, not on any converted copy
+    exifdata = ImageContext.wrap(image).exif
+    if not exifdata:
         return None  # No EXIF data found
 
     # Initialize variables for sensitive data
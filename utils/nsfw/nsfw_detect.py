@@ -1,17 +1,31 @@
 import io
 from PIL import Image
-import requests
 from config import config
 import os
 import logging
 from pathlib import Path
 import json
+from typing import Optional
+
+from utils.cache.result_cache import Uncached
+from utils.pipeline import executor
+from utils.pipeline.image_context import ImageContext
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def read_nsfw(image: Image.Image) -> bool:
+# Bump whenever the provider or request changes so cached results are not reused
+ANALYZER_VERSION = "google-1"
+
+def encode_jpeg(image: Image.Image) -> io.BytesIO:
+    """
+    Flatten transparency onto white and encode the image as JPEG.
+    Uses the request's memoized JPEG so the frame is encoded at most once.
+    """
+    return io.BytesIO(ImageContext.wrap(image).jpeg_bytes(quality=95))
+
+async def read_nsfw(image: Image.Image) -> Optional[Uncached]:
     """
     Analyze image for NSFW content using Eden AI API.
     
@@ -19,38 +33,31 @@ async def read_nsfw(image: Image.Image) -> bool:
         image (PIL.Image.Image): The image to analyze
         
     Returns:
-        bool: True if NSFW content detected, False otherwise
+        None once the provider answered (its verdict is only logged for now), or
+        Uncached(False) when the key is missing or the call failed, so the failure is not cached
     """
     try:
         # Load API key
         api_key = config.EDENAI_API_KEY
-        print("api key ", api_key)
         if not api_key:
             logger.error("EDENAI_API_KEY not found in configuration")
-            return False
+            return Uncached(False)
 
         headers = {"Authorization": f"Bearer {api_key}"}
         url = "https://api.edenai.run/v2/image/explicit_content"
 
-        # Convert RGBA to RGB if necessary
-        if image.mode == 'RGBA':
-            background = Image.new('RGB', image.size, (255, 255, 255))
-            background.paste(image, mask=image.split()[3])
-            image = background
-        
-        # Convert image to JPEG bytes
-        buffer = io.BytesIO()
-        image.save(buffer, format='JPEG', quality=95)
-        buffer.seek(0)
+        # Encode off the event loop, then post with the shared async client
+        buffer = await executor.run_blocking("encode", encode_jpeg, image)
 
         files = {"file": ("image.jpg", buffer, "image/jpeg")}
         data = {"providers": "google"}
 
-        # Make API request
-        response = requests.post(url, data=data, files=files, headers=headers)
+        # Make API request; never wait on EdenAI longer than the analyzer's own deadline
+        timeout = config.NSFW_DEADLINE or config.HTTP_TIMEOUT
+        response = await executor.get_http_client().post(url, data=data, files=files, headers=headers, timeout=timeout)
 
         result = json.loads(response.text)
-        print("result", result)
+        logger.debug(f"NSFW result: {result}")
         
         # if response.status_code == 200:
         #     result = response.json()
@@ -67,7 +74,8 @@ async def read_nsfw(image: Image.Image) -> bool:
 
     except Exception as e:
         logger.error(f"NSFW detection error: {str(e)}")
-        return False
+        # A failed or timed-out call says nothing about the image, so it must not be cached
+        return Uncached(False)
     finally:
         if 'buffer' in locals():
             buffer.close()
\ No newline at end of file
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from fastapi.responses import JSONResponse
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing when a request would wait too long for a slot."""
+
+    def __init__(self, name: str, reason: str, retry_after: int):
+        super().__init__(f"{name} is overloaded ({reason})")
+        self.retry_after = retry_after
+
+
+class _WaitStats:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def summary(self, prefix: str) -> dict:
+        return {
+            f"avg_{prefix}_ms": self.total_ms / self.count if self.count else 0.0,
+            f"max_{prefix}_ms": self.max_ms,
+        }
+
+
+class AdmissionController:
+    """
+    At most max_active requests run at once and at most max_queue wait, in FIFO order, for up to
+    queue_timeout seconds. Anything beyond that is refused at once with a Retry-After estimate,
+    so overload turns into latency for the admitted requests instead of unbounded memory.
+    """
+
+    def __init__(self, name: str, max_active: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_active = max(1, max_active)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait = _WaitStats()
+        self.service = _WaitStats()
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free, from the average time a request holds one."""
+        average_s = (self.service.total_ms / self.service.count / 1000) if self.service.count else 1.0
+        estimate = (len(self._waiters) + 1) * average_s / self.max_active
+        return min(60, max(1, math.ceil(estimate)))
+
+    async def acquire(self):
+        if self._active < self.max_active and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            self.wait.record(0.0)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.name, "queue full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Overloaded(self.name, "queue wait timed out", self.retry_after())
+        except asyncio.CancelledError:
+            # A slot handed over just as the client went away must go to the next waiter
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.admitted += 1
+        self.wait.record((time.perf_counter() - start) * 1000)
+
+    def release(self):
+        # Hand the slot straight to the oldest live waiter, so newcomers cannot jump the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.service.record((time.perf_counter() - start) * 1000)
+            self.release()
+
+    def summary(self) -> dict:
+        return {
+            "active": self._active,
+            "max_active": self.max_active,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            **self.wait.summary("wait"),
+            **self.service.summary("service"),
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying an AdmissionController per path. It runs before the body is read,
+    so shed requests cost almost nothing, and holds the slot until a streamed response is done.
+    """
+
+    def __init__(self, app, routes: Dict[str, AdmissionController]):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        controller = self.routes.get(scope["path"]) if scope["type"] == "http" else None
+        if controller is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            async with controller.slot():
+                await self.app(scope, receive, send)
+        except Overloaded as e:
+            logger.warning(str(e))
+            response = JSONResponse(
+                {"detail": str(e)}, status_code=503, headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+
+
+class Limiter:
+    """Concurrency cap for one analyzer, plus an optional token bucket (rate per second) for external APIs."""
+
+    def __init__(self, name: str, max_concurrency: int, rate: float = 0.0, burst: int = 1):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._bucket_lock = asyncio.Lock()
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self.in_flight = 0
+        self.waiting = 0
+        self.wait = _WaitStats()
+
+    async def _take_token(self):
+        # The lock keeps waiters in FIFO order while they sleep for the bucket to refill
+        async with self._bucket_lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+                self._refilled = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+            try:
+                if self.rate > 0:
+                    await self._take_token()
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.wait.record((time.perf_counter() - start) * 1000)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def summary(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "waiting": self.waiting,
+            "rate_per_second": self.rate,
+            "calls": self.wait.count,
+            **self.wait.summary("wait"),
+        }
+
+
+controllers = {
+    "api": AdmissionController("api", config.API_MAX_ACTIVE, config.API_MAX_QUEUE, config.ADMISSION_QUEUE_TIMEOUT),
+    "extension": AdmissionController("extension", config.EXTENSION_MAX_ACTIVE, config.EXTENSION_MAX_QUEUE,
+                                     config.ADMISSION_QUEUE_TIMEOUT),
+    "batch": AdmissionController("batch", config.BATCH_MAX_ACTIVE, config.BATCH_MAX_QUEUE,
+                                 config.ADMISSION_QUEUE_TIMEOUT),
+}
+
+limiters = {
+    "objects": Limiter("objects", config.OBJECTS_MAX_CONCURRENCY),
+    "faces": Limiter("faces", config.FACES_MAX_CONCURRENCY),
+    "qr": Limiter("qr", config.QR_MAX_CONCURRENCY),
+    "metadata": Limiter("metadata", config.METADATA_MAX_CONCURRENCY),
+    "nsfw": Limiter("nsfw", config.NSFW_MAX_CONCURRENCY, config.NSFW_RATE_LIMIT, config.NSFW_MAX_CONCURRENCY),
+    "llm": Limiter("llm", config.LLM_MAX_CONCURRENCY, config.LLM_RATE_LIMIT, config.LLM_MAX_CONCURRENCY),
+}
+
+
+def metrics() -> dict:
+    return {
+        "admission": {name: controller.summary() for name, controller in controllers.items()},
+        "analyzers": {name: limiter.summary() for name, limiter in limiters.items()},
+    }
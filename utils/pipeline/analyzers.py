@@ -0,0 +1,316 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from config import config
+from utils.cache.phash import near_duplicates as near_duplicate_index
+from utils.cache.result_cache import MISS, Uncached, make_key, result_cache
+from utils.pipeline import admission, executor
+from utils.pipeline.coordinates import scale_detections
+from utils.pipeline.image_context import ImageContext
+from utils.ObjectModel import detect
+from utils.faceDetect import face_detection
+from utils.metadata import read_data
+from utils.qr_code import qr_checker
+from utils.nsfw import nsfw_detect
+from utils.genai_llm import llm_response
+
+logger = logging.getLogger(__name__)
+
+
+class Analyzer:
+    """One analysis step of the /api pipeline and the version its cached results are stored under."""
+
+    def __init__(self, name: str, run, version: str, deadline: float = 0, requires: Tuple[str, ...] = (),
+                 cache_none: bool = True, near_duplicates: bool = False, has_coordinates: bool = False):
+        self.name = name
+        self.run = run
+        self.version = version
+        # Analyzers whose results are passed to run() after the image, in this order
+        self.requires = requires
+        # Seconds the analyzer may take before its section is reported as timed out (0 = no limit)
+        self.deadline = deadline
+        # None from some analyzers means "failed", which must not be cached
+        self.cache_none = cache_none
+        # Whether a resized/recompressed copy may reuse this analyzer's verdict
+        self.near_duplicates = near_duplicates
+        # Results carry boxes that must be rescaled when reused for a differently sized copy
+        self.has_coordinates = has_coordinates
+
+
+ANALYZERS: Dict[str, Analyzer] = {
+    analyzer.name: analyzer for analyzer in [
+        Analyzer("objects", detect.run_detection, detect.ANALYZER_VERSION, config.OBJECTS_DEADLINE,
+                 near_duplicates=True, has_coordinates=True),
+        Analyzer("qr", qr_checker.analyze_qr, qr_checker.ANALYZER_VERSION, config.QR_DEADLINE),
+        Analyzer("metadata", read_data.extract_sensitive_metadata, read_data.ANALYZER_VERSION,
+                 config.METADATA_DEADLINE),
+        Analyzer("faces", face_detection.process_person_regions, face_detection.ANALYZER_VERSION + "-persons",
+                 config.FACES_DEADLINE, requires=("objects",), near_duplicates=True, has_coordinates=True)
+        if config.FACES_ON_PERSONS else
+        Analyzer("faces", face_detection.process_image, face_detection.ANALYZER_VERSION, config.FACES_DEADLINE,
+                 near_duplicates=True, has_coordinates=True),
+        Analyzer("nsfw", nsfw_detect.read_nsfw, nsfw_detect.ANALYZER_VERSION, config.NSFW_DEADLINE),
+        Analyzer("llm", llm_response.llm_process, llm_response.ANALYZER_VERSION, config.LLM_DEADLINE,
+                 cache_none=False, near_duplicates=True),
+    ]
+}
+
+# Named analyzer subsets callers can ask for instead of listing analyzers
+PROFILES: Dict[str, List[str]] = {
+    # Local models only: no third-party API calls or costs
+    "fast": ["objects", "qr", "metadata"],
+    # What an image gives away about the people in it and where it was taken
+    "privacy": ["objects", "metadata", "faces"],
+    "full": ["objects", "qr", "metadata", "faces", "nsfw", "llm"],
+}
+
+# Analyzers each WORKER_ROLE serves; models and SDKs of the others are never imported in that process
+WORKER_ROLES: Dict[str, List[str]] = {
+    "full": list(ANALYZERS),
+    # What the browser extension calls
+    "extension": ["objects", "qr"],
+    # No ML models at all
+    "light": ["qr", "metadata"],
+}
+
+
+def select(analyzers: Optional[str], profile: Optional[str], default: List[str]) -> List[str]:
+    """
+    Analyzer names for a request: a comma-separated list, a profile name, or the endpoint default.
+    The default is narrowed to what this worker role serves; an explicit choice it does not serve
+    raises ValueError, as do unknown names.
+    """
+    if analyzers:
+        names = [name.strip() for name in analyzers.split(",") if name.strip()]
+        unknown = [name for name in names if name not in ANALYZERS]
+        if unknown:
+            raise ValueError(f"Unknown analyzers: {', '.join(unknown)}; choose from {', '.join(ANALYZERS)}")
+        names = list(dict.fromkeys(names))
+    elif profile:
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile: {profile}; choose from {', '.join(PROFILES)}")
+        names = list(PROFILES[profile])
+    else:
+        names = [name for name in default if name in ENABLED] or list(default)
+    check_enabled(names)
+    return names
+
+
+def with_dependencies(names: Iterable[str]) -> List[str]:
+    """names plus everything they require, each dependency listed before its dependents."""
+    ordered = []
+
+    def visit(name):
+        if name in ordered:
+            return
+        for dependency in ANALYZERS[name].requires:
+            visit(dependency)
+        ordered.append(name)
+
+    for name in names:
+        visit(name)
+    return ordered
+
+
+def enabled_analyzers(role: str = None) -> List[str]:
+    """Analyzers served under a worker role (a WORKER_ROLES name or a comma-separated list), with their dependencies."""
+    role = config.WORKER_ROLE if role is None else role
+    if role in WORKER_ROLES:
+        return with_dependencies(WORKER_ROLES[role])
+    names = [name.strip() for name in role.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ANALYZERS]
+    if unknown or not names:
+        raise ValueError(f"Unknown WORKER_ROLE: {role}; choose from {', '.join(WORKER_ROLES)} or list analyzers")
+    return with_dependencies(names)
+
+
+ENABLED = enabled_analyzers()
+
+
+def check_enabled(names: Iterable[str]):
+    """Raises ValueError if any of names (or what they require) is not served by this process."""
+    disabled = [name for name in with_dependencies(names) if name not in ENABLED]
+    if disabled:
+        raise ValueError(f"Analyzers not served by this worker (WORKER_ROLE={config.WORKER_ROLE}): "
+                         f"{', '.join(disabled)}; available: {', '.join(ENABLED)}")
+
+
+def _cache_key(name: str, digest: Optional[str]) -> Optional[str]:
+    if not config.RESULT_CACHE_ENABLED or digest is None:
+        return None
+    return make_key(digest, name, ANALYZERS[name].version)
+
+
+async def get_cached(name: str, digest: Optional[str]) -> Any:
+    """Cached result of one analyzer for this content, or MISS."""
+    key = _cache_key(name, digest)
+    if key is None:
+        return MISS
+    return await result_cache.get(key)
+
+
+async def compute(name: str, image: ImageContext, digest: Optional[str] = None, inputs: tuple = ()) -> Any:
+    """
+    Run one analyzer on a loaded image and store its result under the content digest.
+    inputs are the results of the analyzers it requires.
+    """
+    analyzer = ANALYZERS[name]
+    # Bounded per analyzer, so a spike queues here instead of piling work onto the pools and APIs
+    async with admission.limiters[name]:
+        result = await analyzer.run(image, *inputs)
+    if isinstance(result, Uncached):
+        return result.value
+
+    key = _cache_key(name, digest)
+    if key is not None and (result is not None or analyzer.cache_none):
+        await result_cache.set(key, result)
+    return result
+
+
+def timed_out(seconds: float) -> dict:
+    """Section value for an analyzer that missed its deadline."""
+    return {"timed_out": True, "after_seconds": round(seconds, 3)}
+
+
+def is_timed_out(result: Any) -> bool:
+    return isinstance(result, dict) and result.get("timed_out") is True
+
+
+async def compute_within(name: str, image: ImageContext, digest: Optional[str], timeout: Optional[float],
+                         inputs: tuple = ()) -> Any:
+    """
+    compute() bounded by timeout seconds. A late analyzer is cancelled: awaits on the event loop
+    stop at once, work already handed to a pool thread finishes in the background and is dropped,
+    and nothing is cached for it.
+    """
+    try:
+        return await asyncio.wait_for(compute(name, image, digest, inputs), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Analyzer {name} missed its {timeout:.1f}s deadline")
+        return timed_out(timeout)
+
+
+async def reuse_near_duplicate(hash_value: int, image: ImageContext, digest: str, names: list) -> Dict[str, Any]:
+    """
+    Copy the cached results of a perceptually near-identical earlier image, rescaled to this image.
+    """
+    match = near_duplicate_index.lookup(hash_value)
+    if match is None:
+        return {}
+
+    distance, (source_digest, (source_width, source_height)) = match
+    if source_digest == digest:
+        return {}
+    scale_x = image.width / source_width
+    scale_y = image.height / source_height
+
+    reused = {}
+    for name in names:
+        cached = await get_cached(name, source_digest)
+        if cached is MISS:
+            continue
+        if ANALYZERS[name].has_coordinates:
+            cached = scale_detections(cached, scale_x, scale_y)
+        # Not stored under this digest: an exact-content cache hit must mean this image's own results,
+        # which callers that cannot accept approximations (/redact) rely on
+        reused[name] = cached
+
+    if reused:
+        logger.info(f"Reused {sorted(reused)} from near-duplicate {source_digest[:12]} at distance {distance}")
+    return reused
+
+
+async def iter_analyzers(image: ImageContext, digest: Optional[str], names: Iterable[str],
+                         budget: Optional[float] = config.REQUEST_BUDGET,
+                         deadlines: bool = True, near_duplicates: bool = True) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Yield (name, result) for each analyzer as soon as it is available: cache hits first, then
+    near-duplicate reuse, then computed results in completion order. Each analyzer decodes only the
+    resolution it needs through the shared ImageContext, and on a full cache hit nothing is decoded.
+
+    With deadlines, each analyzer gets min(its own deadline, what is left of the request budget);
+    one that runs over yields a timed_out() section instead of holding up the others.
+
+    Without near_duplicates, results come only from this exact content (cache) or a fresh run, never
+    from a perceptually similar image; its hash is not added to the index either.
+
+    Dependencies of the requested analyzers run too, and each analyzer starts as soon as the ones it
+    requires have finished; only the requested analyzers are yielded.
+    """
+    names = list(names)
+    # Jobs from a shared broker may ask for analyzers another role serves; never load their models here
+    check_enabled(names)
+    requested = set(names)
+    names = with_dependencies(names)
+    loop = asyncio.get_running_loop()
+    budget_ends = loop.time() + budget if deadlines and budget else None
+
+    def timeout_for(name: str) -> Optional[float]:
+        if not deadlines:
+            return None
+        limits = [ANALYZERS[name].deadline or None]
+        if budget_ends is not None:
+            limits.append(max(0.0, budget_ends - loop.time()))
+        limits = [limit for limit in limits if limit is not None]
+        return min(limits) if limits else None
+
+    results = {}
+    missing = []
+    for name in names:
+        cached = await get_cached(name, digest)
+        if cached is MISS:
+            missing.append(name)
+            continue
+        results[name] = cached
+        if name in requested:
+            yield name, cached
+
+    if not missing:
+        return
+
+    # Resized, recompressed or EXIF-stripped copies miss the SHA-256 cache but match perceptually
+    hash_value = None
+    reusable = [name for name in missing if ANALYZERS[name].near_duplicates] if near_duplicates else []
+    if reusable and config.PHASH_ENABLED and _cache_key(reusable[0], digest) is not None:
+        hash_value = await executor.run_blocking(
+            "encode", lambda: near_duplicate_index.compute(image.reduced(config.PHASH_DECODE_MAX_SIDE).image)
+        )
+        reused = await reuse_near_duplicate(hash_value, image, digest, reusable)
+        results.update(reused)
+        for name, result in reused.items():
+            if name in requested:
+                yield name, result
+        missing = [name for name in missing if name not in reused]
+
+    async def run(name):
+        inputs = []
+        for dependency in ANALYZERS[name].requires:
+            inputs.append(results[dependency] if dependency in results else (await tasks[dependency])[1])
+        return name, await compute_within(name, image, digest, timeout_for(name), tuple(inputs))
+
+    # Every task is registered before any of them starts, so dependents can always find theirs
+    tasks = {name: asyncio.ensure_future(run(name)) for name in missing}
+    try:
+        for next_result in asyncio.as_completed(list(tasks.values())):
+            name, result = await next_result
+            if name in requested:
+                yield name, result
+    finally:
+        # A consumer that stops early (e.g. a disconnected client) should not leave analyzers running
+        for task in tasks.values():
+            task.cancel()
+
+    if hash_value is not None:
+        near_duplicate_index.add(hash_value, (digest, image.size))
+
+
+async def run_analyzers(image: ImageContext, digest: Optional[str], names: Iterable[str],
+                        deadlines: bool = True, near_duplicates: bool = True) -> Dict[str, Any]:
+    """
+    Run several analyzers concurrently; on a partial cache hit only the missing ones do any work.
+    """
+    names = list(names)
+    results = {name: result async for name, result in iter_analyzers(image, digest, names, deadlines=deadlines,
+                                                                     near_duplicates=near_duplicates)}
+    return {name: results[name] for name in names}
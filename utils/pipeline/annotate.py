@@ -0,0 +1,59 @@
+import io
+from typing import Any, Iterator, Tuple
+
+from PIL import ImageDraw
+
+from config import config
+from utils.pipeline.image_context import ImageContext
+
+# Output format -> (PIL format, media type)
+FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+# Box colours per analyzer section, RGB
+COLORS = {
+    "objects": (255, 64, 64),
+    "faces": (0, 255, 0),
+}
+
+
+def _boxes(section: Any) -> Iterator[Tuple[str, dict]]:
+    """(label, box) pairs of a detected_objects list or a single {"object", "coordinates"} entry."""
+    if isinstance(section, dict):
+        section = [section]
+    if not isinstance(section, list):
+        return
+    for entry in section:
+        if isinstance(entry, dict):
+            for box in entry.get("coordinates", []):
+                yield entry.get("object", ""), box
+
+
+def render_overlay(image: ImageContext, results: dict, fmt: str = "jpeg") -> bytes:
+    """
+    One overlay with the object and face boxes of results, drawn on an ANNOTATE_MAX_SIDE decode
+    and encoded as JPEG or WebP. The analyzers themselves never draw, so this is the only render pass.
+    """
+    reduced = image.reduced(config.ANNOTATE_MAX_SIDE)
+    scale_x, scale_y = reduced.scale
+    # The one copy: the shared decode stays clean for the other consumers of this image
+    canvas = reduced.rgb.copy()
+    draw = ImageDraw.Draw(canvas)
+
+    for name, color in COLORS.items():
+        for label, box in _boxes(results.get(name)):
+            left, top = box["x"] / scale_x, box["y"] / scale_y
+            right, bottom = (box["x"] + box["width"]) / scale_x, (box["y"] + box["height"]) / scale_y
+            draw.rectangle([left, top, right, bottom], outline=color, width=2)
+            draw.text((left + 2, max(0, top - 12)), label, fill=color)
+
+    pil_format, _ = FORMATS[fmt]
+    buffer = io.BytesIO()
+    if pil_format == "WEBP":
+        # method=0 is libwebp's fastest encoder setting
+        canvas.save(buffer, pil_format, quality=config.ANNOTATE_QUALITY, method=0)
+    else:
+        canvas.save(buffer, pil_format, quality=config.ANNOTATE_QUALITY)
+    return buffer.getvalue()
@@ -0,0 +1,275 @@
+import asyncio
+import concurrent.futures
+import logging
+import tarfile
+import tempfile
+import threading
+import zipfile
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from fastapi import HTTPException, Request
+
+from config import config
+from utils.pipeline import executor, ingest
+from utils.pipeline.ingest import IngestedUpload
+
+logger = logging.getLogger(__name__)
+
+# Non-multipart bodies accepted as a single archive
+ARCHIVE_CONTENT_TYPES = {
+    "application/zip",
+    "application/x-zip-compressed",
+    "application/x-tar",
+    "application/gzip",
+    "application/x-gzip",
+    "application/octet-stream",
+}
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+BATCH_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                }
+            },
+            "application/zip": {"schema": {"type": "string", "format": "binary"}},
+            "application/x-tar": {"schema": {"type": "string", "format": "binary"}},
+        },
+    }
+}
+
+_DONE = object()
+
+
+class BatchItem:
+    """One entry of a batch: an ingested image, or the reason it was rejected."""
+
+    def __init__(self, index: int, filename: Optional[str], upload: Optional[IngestedUpload] = None,
+                 error: Optional[str] = None):
+        self.index = index
+        self.filename = filename
+        self.upload = upload
+        self.error = error
+
+
+class _Stopped(Exception):
+    """The consumer went away; unwinds the unpacking thread."""
+
+
+class _ArchiveSink:
+    """Spools an archive part of a multipart batch so it can be unpacked once complete."""
+
+    def __init__(self, filename: Optional[str]):
+        self.filename = filename
+        self.file = tempfile.TemporaryFile()
+
+    def write(self, data: bytes):
+        self.file.write(data)
+
+    def finish(self) -> "_ArchiveSink":
+        self.file.seek(0)
+        return self
+
+
+def is_archive(filename: Optional[str], content_type: str) -> bool:
+    if content_type in ARCHIVE_CONTENT_TYPES and content_type != "application/octet-stream":
+        return True
+    return bool(filename) and filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+class _Unpacker:
+    """Turns a spooled batch body into BatchItems, in order, on a worker thread."""
+
+    def __init__(self, emit: Callable[[BatchItem], None]):
+        self.emit = emit
+        self.files = 0
+        self.unpacked_bytes = 0
+
+    def add(self, filename: Optional[str], upload: Optional[IngestedUpload] = None, error: Optional[str] = None):
+        if self.files >= config.BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"Batch has more than {config.BATCH_MAX_FILES} files")
+        self.emit(BatchItem(self.files, filename, upload, error))
+        self.files += 1
+
+    def add_member(self, filename: str, size: int, open_member: Callable):
+        if size > config.MAX_UPLOAD_BYTES:
+            self.add(filename, error=f"Upload exceeds {config.MAX_UPLOAD_BYTES} bytes")
+            return
+        # Unpacked bytes count against the batch budget too, so a compression bomb cannot get around it
+        self.unpacked_bytes += size
+        if self.unpacked_bytes > config.BATCH_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {config.BATCH_MAX_BYTES} bytes unpacked")
+        try:
+            with open_member() as member:
+                upload = ingest.ingest_file(member, filename)
+        except HTTPException as e:
+            self.add(filename, error=e.detail)
+            return
+        self.add(filename, upload)
+
+    def unpack_archive(self, fileobj):
+        """Entries of a ZIP or (compressed) TAR file, in archive order."""
+        try:
+            if zipfile.is_zipfile(fileobj):
+                fileobj.seek(0)
+                with zipfile.ZipFile(fileobj) as archive:
+                    for info in archive.infolist():
+                        if not info.is_dir() and not info.filename.startswith("__MACOSX/"):
+                            self.add_member(info.filename, info.file_size, lambda: archive.open(info))
+                return
+
+            # Stream mode reads members front to back without building an index first
+            fileobj.seek(0)
+            with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+                for member in archive:
+                    if member.isfile():
+                        self.add_member(member.name, member.size, lambda: archive.extractfile(member))
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            raise HTTPException(status_code=400, detail=f"Unreadable archive: {str(e)}")
+
+    def unpack_multipart(self, fileobj, boundary: bytes):
+        """Image and archive parts of a multipart body, in the order they were sent."""
+
+        def choose_sink(name, filename, content_type):
+            if filename is None:
+                return None  # plain form field
+            if is_archive(filename, content_type):
+                return _ArchiveSink(filename)
+            return ingest.ImageSink(filename)
+
+        def on_error(sink, error):
+            return (sink.filename, error.detail)
+
+        reader = ingest.PartReader(boundary, choose_sink, on_error)
+        while True:
+            chunk = fileobj.read(256 * 1024)
+            if chunk:
+                reader.write(chunk)
+            else:
+                reader.finalize()
+            for completed in reader.completed:
+                if isinstance(completed, _ArchiveSink):
+                    with completed.file:
+                        self.unpack_archive(completed.file)
+                elif isinstance(completed, tuple):
+                    self.add(completed[0], error=completed[1])
+                else:
+                    self.add(completed.filename, completed)
+            reader.completed.clear()
+            if not chunk:
+                return
+
+
+class BatchUpload:
+    """A received batch body, spooled to disk; items() unpacks it while results are streamed back."""
+
+    def __init__(self, spool, boundary: Optional[bytes]):
+        self.spool = spool
+        self.boundary = boundary
+
+    def _unpack(self, unpacker: _Unpacker):
+        with self.spool:
+            if self.boundary is not None:
+                unpacker.unpack_multipart(self.spool, self.boundary)
+            else:
+                unpacker.unpack_archive(self.spool)
+
+    async def items(self) -> AsyncIterator[BatchItem]:
+        """
+        Batch entries in input order. Unpacking runs on the archive pool a few entries ahead of the
+        consumer, so at most BATCH_CONCURRENCY ingested-but-unclaimed uploads are held at once.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=max(1, config.BATCH_CONCURRENCY))
+        stop = threading.Event()
+
+        def emit(item):
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    return future.result(timeout=0.25)
+                except concurrent.futures.TimeoutError:
+                    if stop.is_set():
+                        future.cancel()
+                        raise _Stopped()
+
+        def run():
+            try:
+                self._unpack(_Unpacker(emit))
+            except _Stopped:
+                return
+            finally:
+                if not stop.is_set():
+                    emit(_DONE)
+
+        work = asyncio.ensure_future(executor.run_blocking("archive", run))
+        try:
+            while (item := await queue.get()) is not _DONE:
+                yield item
+            # Re-raises whatever ended the unpacking early (limits, a corrupt archive)
+            await work
+        finally:
+            stop.set()
+
+
+async def receive_batch(request: Request) -> BatchUpload:
+    """
+    FastAPI dependency: spool a batch body to an anonymous temp file.
+
+    The body is received in full before the response starts, because a streaming response
+    consumes the request's receive channel while it is being sent.
+    """
+    ingest.check_content_length(request, config.BATCH_MAX_BYTES)
+
+    boundary = ingest.multipart_boundary(request)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if boundary is None and content_type not in ARCHIVE_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data or a ZIP/TAR archive")
+
+    spool = tempfile.TemporaryFile()
+    size = 0
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > config.BATCH_MAX_BYTES + ingest.MULTIPART_OVERHEAD:
+                raise HTTPException(status_code=413, detail=f"Batch exceeds {config.BATCH_MAX_BYTES} bytes")
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return BatchUpload(spool, boundary)
+
+
+async def map_ordered(items: AsyncIterator, func: Callable[[Any], Awaitable], concurrency: int) -> AsyncIterator:
+    """
+    Apply func to every item with at most `concurrency` calls in flight, yielding results in input order.
+    """
+    slots = asyncio.Semaphore(max(1, concurrency))
+    pending = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for item in items:
+                await slots.acquire()
+                pending.put_nowait(asyncio.ensure_future(func(item)))
+        finally:
+            pending.put_nowait(None)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while (task := await pending.get()) is not None:
+            result = await task
+            slots.release()
+            yield result
+        await producer
+    finally:
+        producer.cancel()
+        while not pending.empty():
+            task = pending.get_nowait()
+            if task is not None:
+                task.cancel()
@@ -0,0 +1,91 @@
+import asyncio
+import contextvars
+import logging
+from typing import Any, Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Set by /api/batch for the analyzers of each of its images, so the images of one batch request are
+# micro-batched through YOLO and the face detector even when YOLO_BATCH_SIZE/FACE_BATCH_SIZE are 1
+route_batch_size = contextvars.ContextVar("route_batch_size", default=1)
+
+
+def batch_size(configured: int) -> int:
+    """Micro-batch size for the current request: the larger of the configured and the route's size."""
+    return max(configured, route_batch_size.get())
+
+
+class MicroBatcher:
+    """
+    Collect items from concurrent requests and run them through one batched model call.
+
+    A batch is dispatched as soon as it holds max_batch_size items or max_wait_ms has passed
+    since its first item arrived, so the extra latency a caller can see is bounded by max_wait_ms.
+    """
+
+    def __init__(self, name: str, run_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch_size: int, max_wait_ms: float):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = None
+        self._collector = None
+        self._inflight = set()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its own result from the batch it lands in."""
+        loop = asyncio.get_running_loop()
+        if self._collector is None or self._collector.done():
+            self._queue = asyncio.Queue()
+            self._collector = loop.create_task(self._collect())
+
+        future = loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Skip callers that gave up while we were collecting
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            # Dispatch in the background so the next batch can be collected meanwhile
+            task = loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = await self.run_batch(items)
+            logger.debug(f"{self.name} batch of {len(items)} done")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """Stop collecting; batches already dispatched finish normally."""
+        if self._collector is not None:
+            self._collector.cancel()
+            self._collector = None
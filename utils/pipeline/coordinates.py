@@ -0,0 +1,27 @@
+from typing import Any
+
+
+def scale_box(box: dict, scale_x: float, scale_y: float) -> dict:
+    """Scale one {x, y, width, height} box."""
+    return {
+        "x": int(round(box["x"] * scale_x)),
+        "y": int(round(box["y"] * scale_y)),
+        "width": int(round(box["width"] * scale_x)),
+        "height": int(round(box["height"] * scale_y)),
+    }
+
+
+def scale_detections(result: Any, scale_x: float, scale_y: float) -> Any:
+    """
+    Scale the coordinates of a detector result into another image space.
+    Accepts a detection_list ([{"object", "coordinates"}]) or a single face result dict.
+    """
+    if not result or (scale_x == 1 and scale_y == 1):
+        return result
+    if isinstance(result, list):
+        return [scale_detections(item, scale_x, scale_y) for item in result]
+    if isinstance(result, dict) and "coordinates" in result:
+        scaled = dict(result)
+        scaled["coordinates"] = [scale_box(box, scale_x, scale_y) for box in result["coordinates"]]
+        return scaled
+    return result
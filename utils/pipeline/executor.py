@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+import httpx
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Number of worker threads for each CPU-bound analyzer
+POOL_SIZES = {
+    "yolo": config.YOLO_POOL_SIZE,
+    "faces": config.FACE_POOL_SIZE,
+    "qr": config.QR_POOL_SIZE,
+    "metadata": config.METADATA_POOL_SIZE,
+    "encode": config.ENCODE_POOL_SIZE,
+    "cache": config.CACHE_POOL_SIZE,
+    "archive": config.ARCHIVE_POOL_SIZE,
+    "jobs": config.JOBS_POOL_SIZE,
+    "sandbox": config.SANDBOX_POOL_SIZE,
+    "video": config.VIDEO_POOL_SIZE,
+}
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+_http_client = None
+
+
+def get_executor(name: str) -> ThreadPoolExecutor:
+    """Return the bounded thread pool for an analyzer, creating it on first use."""
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                if name not in POOL_SIZES:
+                    raise ValueError(f"Unknown executor: {name}")
+                executor = ThreadPoolExecutor(
+                    max_workers=max(1, POOL_SIZES[name]),
+                    thread_name_prefix=f"{name}-worker",
+                )
+                _executors[name] = executor
+                logger.info(f"Started {name} pool with {POOL_SIZES[name]} workers")
+    return executor
+
+
+async def run_blocking(name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking function on the named analyzer pool without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(name), partial(func, *args, **kwargs))
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared async HTTP client so I/O-bound analyzers reuse one connection pool."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=config.HTTP_TIMEOUT,
+            limits=httpx.Limits(keepalive_expiry=config.HTTP_KEEPALIVE),
+        )
+    return _http_client
+
+
+async def shutdown():
+    """Close the HTTP client and stop all analyzer pools."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
@@ -0,0 +1,210 @@
+import io
+import threading
+from typing import Any, Callable, Union
+
+import numpy as np
+from PIL import Image
+
+
+class MemoryReader(io.RawIOBase):
+    """Seekable file object over a bytes-like buffer (bytes or mmap) without copying it."""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._view[self._pos:self._pos + len(b)]
+        n = len(chunk)
+        b[:n] = chunk
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = len(self._view) + offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def to_rgb(image: Image.Image) -> Image.Image:
+    """Convert to RGB, flattening any transparency onto white."""
+    if image.mode == "RGB":
+        return image
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[3])
+        return background
+    return image.convert("RGB")
+
+
+class ImageContext:
+    """
+    One decoded upload shared by every analyzer of a request.
+
+    Conversions (RGB, arrays, reduced-resolution decodes, encoded bytes) are computed on first use and
+    memoized, so each full-frame copy or encode happens at most once per request no matter how
+    many analyzers need it. Safe to use from several analyzer threads at once.
+    """
+
+    def __init__(self, image: Image.Image, source=None, scale=(1.0, 1.0)):
+        self.image = image
+        # Raw upload bytes (bytes or mmap), kept so reduced-resolution variants can be decoded from it
+        self.source = source
+        # Multiply this context's coordinates by scale to get coordinates in the original upload
+        self.scale = scale
+        self._memo = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        # PIL's lazy load and EXIF parsing both touch the underlying file object
+        self._image_lock = threading.Lock()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ImageContext":
+        return cls(Image.open(io.BytesIO(data)), data)
+
+    @classmethod
+    def wrap(cls, image: Union["ImageContext", Image.Image]) -> "ImageContext":
+        """Accept either a context or a bare PIL image, so analyzers keep working standalone."""
+        return image if isinstance(image, cls) else cls(image)
+
+    def _memoize(self, key: Any, build: Callable[[], Any]) -> Any:
+        if key in self._memo:
+            return self._memo[key]
+        with self._locks_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        # Per-key lock: concurrent analyzers wait for the first builder instead of duplicating work
+        with lock:
+            if key not in self._memo:
+                self._memo[key] = build()
+        return self._memo[key]
+
+    def _with_image(self, func: Callable[[], Any]) -> Any:
+        with self._image_lock:
+            return func()
+
+    def load(self) -> "ImageContext":
+        """Decode the pixels; PIL's lazy load is not safe to trigger from several threads."""
+        self._memoize("loaded", lambda: self._with_image(self.image.load))
+        return self
+
+    @property
+    def exif(self):
+        """
+        Legacy EXIF dict of the original image; read from the header, no pixel decode needed.
+        None when the image has no EXIF, {} for formats without legacy EXIF (GIF, BMP, TIFF).
+        """
+        def build():
+            getexif = getattr(self.image, "_getexif", None)
+            return self._with_image(getexif) if getexif is not None else {}
+        return self._memoize("exif", build)
+
+    @property
+    def orientation(self) -> int:
+        """EXIF orientation tag (1-8) of the original image, 1 when there is none. Works for every format."""
+        return self._memoize("orientation", lambda: self._with_image(self.image.getexif).get(0x0112, 1))
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def width(self) -> int:
+        return self.image.width
+
+    @property
+    def height(self) -> int:
+        return self.image.height
+
+    @property
+    def rgb(self) -> Image.Image:
+        """The image in RGB mode, with any transparency flattened onto white."""
+        return self._memoize("rgb", lambda: to_rgb(self.load().image))
+
+    @property
+    def rgb_array(self) -> np.ndarray:
+        """HxWx3 uint8 RGB array. Treat as read-only: it is shared."""
+        return self._memoize("rgb_array", lambda: np.asarray(self.rgb))
+
+    @property
+    def bgr_array(self) -> np.ndarray:
+        """OpenCV/Ultralytics channel order, as a view on rgb_array (no copy)."""
+        return self._memoize("bgr_array", lambda: self.rgb_array[..., ::-1])
+
+    @property
+    def gray_array(self) -> np.ndarray:
+        """HxW uint8 luminance array."""
+        def build():
+            image = self.load().image
+            source = image if image.mode in ("L", "RGB") else self.rgb
+            return np.asarray(source.convert("L"))
+        return self._memoize("gray_array", build)
+
+    def reduced(self, max_side: int) -> "ImageContext":
+        """
+        This image decoded with its longer side at most max_side, as its own context.
+
+        JPEGs are decoded straight to a smaller size with libjpeg DCT scaling (draft()), and any
+        remaining factor is removed with reduce()-backed thumbnailing, so the full-resolution frame
+        is never materialised when it was not already. draft() does nothing for other formats, so
+        those are decoded once and every size is shrunk from the smallest larger copy already made.
+        The returned context's scale maps its coordinates back into this image. max_side of 0 means
+        full resolution.
+        """
+        if not max_side or max(self.size) <= max_side:
+            return self
+        return self._memoize(("reduced", max_side), lambda: self._decode_reduced(max_side))
+
+    def _decode_reduced(self, max_side: int) -> "ImageContext":
+        if self.source is not None and self.image.format == "JPEG" and "loaded" not in self._memo:
+            image = Image.open(MemoryReader(self.source))
+            ratio = max_side / max(image.size)
+            image.draft("RGB", (max(1, int(image.width * ratio)), max(1, int(image.height * ratio))))
+            image.load()
+            image = to_rgb(image)
+        else:
+            image = self._shrink_source(max_side).copy()
+
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+        scale = (self.width / image.width, self.height / image.height)
+        return ImageContext(image, scale=scale)
+
+    def _shrink_source(self, max_side: int) -> Image.Image:
+        """The smallest reduced copy already made that is still larger than max_side, else the full decode."""
+        larger = [
+            (key[1], value) for key, value in list(self._memo.items())
+            if isinstance(key, tuple) and key[0] == "reduced" and key[1] > max_side
+        ]
+        if larger:
+            return min(larger, key=lambda item: item[0])[1].rgb
+        # Decoded (and memoized) once at full size; shrinking that is cheaper than decoding again
+        return self.rgb
+
+    def jpeg_bytes(self, quality: int = 95) -> bytes:
+        def build():
+            with io.BytesIO() as buffer:
+                self.rgb.save(buffer, format="JPEG", quality=quality)
+                return buffer.getvalue()
+        return self._memoize(("jpeg", quality), build)
+
+    def png_bytes(self) -> bytes:
+        def build():
+            with io.BytesIO() as buffer:
+                self.rgb.save(buffer, format="PNG")
+                return buffer.getvalue()
+        return self._memoize("png", build)
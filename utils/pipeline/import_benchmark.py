@@ -0,0 +1,77 @@
+"""
+Import-time benchmark for API worker startup.
+
+Imports main in a fresh interpreter under python -X importtime for each worker role and reports
+the wall time, the peak RSS and the packages that cost the most import time. With --max-seconds it
+exits 1 when any role is slower, so a heavy import creeping back onto the startup path fails.
+
+    python -m utils.pipeline.import_benchmark --roles full,extension,light --max-seconds 2
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Prints the child's own peak RSS (KiB on Linux) once main is imported
+PROBE = "import main, resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Microseconds spent importing each top-level package, from -X importtime output."""
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if not own.strip().isdigit():
+            continue  # the header line
+        # Self time, so nested imports are not counted twice
+        totals[name.strip().split(".")[0]] += int(own)
+    return totals
+
+
+def measure(role: str) -> dict:
+    env = dict(os.environ, WORKER_ROLE=role, PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"import main failed for WORKER_ROLE={role}:\n{proc.stderr[-2000:]}")
+    return {
+        "role": role,
+        "seconds": elapsed,
+        "max_rss_mb": int(proc.stdout.strip().splitlines()[-1]) / 1024,
+        "modules": parse_importtime(proc.stderr),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--roles", default="full,extension,light", help="comma-separated WORKER_ROLE values")
+    parser.add_argument("--runs", type=int, default=3, help="imports per role; the fastest one is reported")
+    parser.add_argument("--top", type=int, default=10, help="slowest packages to list")
+    parser.add_argument("--max-seconds", type=float, default=0, help="fail if a role takes longer (0 = report only)")
+    args = parser.parse_args()
+
+    failed = []
+    for role in [role.strip() for role in args.roles.split(",") if role.strip()]:
+        result = min((measure(role) for _ in range(max(1, args.runs))), key=lambda r: r["seconds"])
+        print(f"WORKER_ROLE={role}: {result['seconds']:.2f}s, peak RSS {result['max_rss_mb']:.0f} MB")
+        slowest = sorted(result["modules"].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for module, microseconds in slowest:
+            print(f"    {microseconds / 1000:8.1f} ms  {module}")
+        if args.max_seconds and result["seconds"] > args.max_seconds:
+            failed.append(role)
+
+    if failed:
+        print(f"Over the {args.max_seconds:.2f}s budget: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
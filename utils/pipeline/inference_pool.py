@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Tuple
+
+import numpy as np
+
+from config import config
+from utils.pipeline import executor
+from utils.pipeline.image_context import ImageContext
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+def enabled() -> bool:
+    """True when YOLO and face detection should run in the dedicated worker processes."""
+    return config.INFERENCE_BACKEND == "process"
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Start the inference worker processes on first use."""
+    global _pool
+    if _pool is None:
+        # spawn keeps torch/TensorFlow thread pools from being inherited half-initialised
+        _pool = ProcessPoolExecutor(
+            max_workers=config.INFERENCE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(config.INFERENCE_THREADS_PER_WORKER,),
+        )
+        logger.info(f"Started {config.INFERENCE_WORKERS} inference worker processes")
+    return _pool
+
+
+def shutdown():
+    """Stop the inference workers."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _init_worker(num_threads: int):
+    """Load YOLO and the face detector once per worker process, if this worker role serves them."""
+    # Each worker gets a slice of the cores instead of every framework grabbing all of them
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(num_threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+
+    from utils.pipeline import analyzers
+    if "objects" in analyzers.ENABLED:
+        # Only YOLO needs torch; a faces-only worker does not pay for importing it
+        import torch
+        torch.set_num_threads(num_threads)
+        from utils.ObjectModel import detect
+        detect.release_model(detect.load_model())
+    if "faces" in analyzers.ENABLED:
+        from utils.faceDetect import face_detection
+        face_detection.get_detector()
+
+    logger.info(f"Inference worker {os.getpid()} ready")
+
+
+def share_array(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, tuple]:
+    """
+    Copy a frame into a new shared memory block.
+    Returns the block (owned by the caller) and a small picklable descriptor for the worker.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=array.nbytes)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach(descriptor: tuple) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    """Map a frame shared by the API process without copying it."""
+    name, shape, dtype = descriptor
+    # Spawned workers report to the API process's resource tracker, which already tracks the block;
+    # unregistering it here would drop the API process's own registration
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _detect_in_worker(descriptor: tuple) -> list:
+    return _detect_batch_in_worker([descriptor])[0]
+
+
+def _detect_batch_in_worker(descriptors: List[tuple]) -> List[list]:
+    from utils.ObjectModel import detect
+
+    attached = [_attach(descriptor) for descriptor in descriptors]
+    try:
+        # Ultralytics reads numpy input as BGR
+        return detect.detect_objects_batch([frame[..., ::-1] for _, frame in attached])
+    finally:
+        # Drop every view on the blocks before closing them
+        blocks = [shm for shm, _ in attached]
+        del attached
+        for shm in blocks:
+            shm.close()
+
+
+def _detect_windows_in_worker(descriptor: tuple, windows: List[tuple]) -> list:
+    from utils.ObjectModel import detect
+
+    shm, frame = _attach(descriptor)
+    try:
+        return detect.detect_windows(frame, windows)
+    finally:
+        del frame
+        shm.close()
+
+
+def _faces_in_worker(descriptor: tuple, confidence_thresholds: List[float]):
+    from utils.faceDetect import face_detection
+
+    shm, frame = _attach(descriptor)
+    try:
+        # Face detection takes OpenCV (BGR) frames
+        return face_detection.find_best_faces(frame[..., ::-1], confidence_thresholds)
+    finally:
+        del frame
+        shm.close()
+
+
+def _faces_batch_in_worker(descriptors: List[tuple], confidence_thresholds: List[float]):
+    from utils.faceDetect import face_detection
+
+    attached = [_attach(descriptor) for descriptor in descriptors]
+    try:
+        return face_detection.find_best_faces_batch(
+            [frame[..., ::-1] for _, frame in attached], confidence_thresholds
+        )
+    finally:
+        blocks = [shm for shm, _ in attached]
+        del attached
+        for shm in blocks:
+            shm.close()
+
+
+def _to_rgb_array(image) -> np.ndarray:
+    # Reuses the request's memoized RGB frame when given an ImageContext
+    return ImageContext.wrap(image).rgb_array
+
+
+async def _run_shared(func, image: ImageContext, *args):
+    """Hand the decoded frame to a worker through shared memory and await its result."""
+    array = await executor.run_blocking("encode", _to_rgb_array, image)
+    shm, descriptor = share_array(array)
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_pool(), func, descriptor, *args)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+async def run_detection(image: ImageContext) -> list:
+    """YOLO detection in an inference worker."""
+    return await _run_shared(_detect_in_worker, image)
+
+
+async def _run_shared_batch(func, images: List[ImageContext], *args):
+    """Share several frames at once and run a batched worker function over them."""
+    arrays = await asyncio.gather(*[executor.run_blocking("encode", _to_rgb_array, image) for image in images])
+    shared = [share_array(array) for array in arrays]
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_pool(), func, [d for _, d in shared], *args)
+    finally:
+        for shm, _ in shared:
+            shm.close()
+            shm.unlink()
+
+
+async def run_detection_batch(images: List[ImageContext]) -> List[list]:
+    """Batched YOLO detection over several frames in a single inference worker."""
+    return await _run_shared_batch(_detect_batch_in_worker, images)
+
+
+async def detect_windows(image: ImageContext, chunks: List[List[tuple]]) -> List[list]:
+    """
+    Tiled YOLO detection: the frame is shared once and each chunk of windows runs in its own
+    worker, in parallel. Returns the boxes of each chunk in frame coordinates.
+    """
+    array = await executor.run_blocking("encode", _to_rgb_array, image)
+    shm, descriptor = share_array(array)
+    try:
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*[
+            loop.run_in_executor(get_pool(), _detect_windows_in_worker, descriptor, windows) for windows in chunks
+        ])
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+async def find_best_faces(image: ImageContext, confidence_thresholds: List[float]):
+    """Face detection in an inference worker."""
+    return await _run_shared(_faces_in_worker, image, confidence_thresholds)
+
+
+async def find_best_faces_batch(images: List[ImageContext], confidence_thresholds: List[float]):
+    """Batched face detection over several frames in a single inference worker."""
+    return await _run_shared_batch(_faces_batch_in_worker, images, confidence_thresholds)
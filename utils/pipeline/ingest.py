@@ -0,0 +1,311 @@
+import hashlib
+import io
+import logging
+import mmap
+import tempfile
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+from PIL import Image
+
+from config import config
+from utils.pipeline.image_context import ImageContext, MemoryReader
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+# Keep PIL's own decompression-bomb guard in line with ours
+Image.MAX_IMAGE_PIXELS = config.MAX_IMAGE_PIXELS
+
+# Leading bytes of the formats we accept
+MAGIC_BYTES = [
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+]
+
+# Multipart framing allowance on top of the file itself when checking Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
+
+# OpenAPI description of the multipart body, since the endpoints no longer declare an UploadFile
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """Image format from the first bytes of the upload, or None if unsupported."""
+    for magic, image_format in MAGIC_BYTES:
+        if head.startswith(magic):
+            return image_format
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+class IngestedUpload:
+    """An uploaded image held in memory, or memory-mapped from a temp file once it got large."""
+
+    def __init__(self, buffer, filename: Optional[str], size: int, digest: str, image_format: str):
+        self.buffer = buffer
+        self.filename = filename
+        self.size = size
+        self.digest = digest
+        self.format = image_format
+
+    def open_image(self) -> ImageContext:
+        return ImageContext(Image.open(MemoryReader(self.buffer)), self.buffer)
+
+    def read(self) -> bytes:
+        return bytes(self.buffer)
+
+
+class ImageSink:
+    """Receives the file part chunk by chunk, validating it while it is still arriving."""
+
+    def __init__(self, filename: Optional[str]):
+        self.filename = filename
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.format = None
+        self.header_checked = False
+        self._head = bytearray()
+        self._memory = io.BytesIO()
+        self._file = None
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > config.MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {config.MAX_UPLOAD_BYTES} bytes")
+
+        self.sha256.update(data)
+        if not self.header_checked:
+            self._probe_header(data)
+
+        if self._file is None and self.size > config.INGEST_SPOOL_BYTES:
+            # Roll over to disk; the finished upload is memory-mapped instead of held in RAM
+            self._file = tempfile.TemporaryFile()
+            self._file.write(self._memory.getbuffer())
+            self._memory = None
+
+        if self._file is None:
+            self._memory.write(data)
+        else:
+            self._file.write(data)
+
+    def _probe_header(self, data: bytes):
+        self._head += data
+        if self.format is None and len(self._head) >= 12:
+            self.format = sniff_format(bytes(self._head[:12]))
+            if self.format is None:
+                raise HTTPException(status_code=415, detail="Unsupported or invalid image format")
+
+        if self.format is None:
+            return
+        # Image.open only parses the header, so dimensions are known long before the pixels arrive
+        try:
+            width, height = Image.open(io.BytesIO(self._head)).size
+        except Image.DecompressionBombError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception:
+            if len(self._head) >= config.INGEST_HEADER_PROBE_BYTES:
+                # Header is unusually deep (big EXIF/ICC blocks); check again once the body is in
+                self.header_checked = True
+                self._head = bytearray()
+            return
+
+        self.header_checked = True
+        self._head = bytearray()
+        check_dimensions(width, height)
+
+    def finish(self) -> IngestedUpload:
+        if self.size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+        if self.format is None:
+            raise HTTPException(status_code=415, detail="Unsupported or invalid image format")
+
+        if self._file is None:
+            buffer = self._memory.getbuffer()
+        else:
+            self._file.flush()
+            buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            # mmap keeps its own handle; the unlinked temp file disappears with the mapping
+            self._file.close()
+
+        upload = IngestedUpload(buffer, self.filename, self.size, self.sha256.hexdigest(), self.format)
+        if not self.header_checked:
+            try:
+                width, height = Image.open(MemoryReader(buffer)).size
+            except Image.DecompressionBombError as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+            check_dimensions(width, height)
+        return upload
+
+
+def check_dimensions(width: int, height: int):
+    if width * height > config.MAX_IMAGE_PIXELS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image is {width}x{height}; at most {config.MAX_IMAGE_PIXELS} pixels are accepted",
+        )
+
+
+def check_content_length(request: Request, limit: int):
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {limit} bytes")
+
+
+def multipart_boundary(request: Request) -> Optional[bytes]:
+    """Boundary of a multipart/form-data request, or None for any other content type."""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data":
+        return None
+    return params.get(b"boundary")
+
+
+class PartReader:
+    """
+    Push parser for a multipart/form-data body. Each part is handed to the sink that choose_sink
+    returns for its (field name, filename, content type), or skipped if it returns None; the
+    finish() results of completed sinks accumulate in `completed`.
+
+    With on_error, an HTTPException from one part is turned into an entry of `completed` instead
+    of aborting the whole body.
+    """
+
+    def __init__(self, boundary: bytes, choose_sink: Callable, on_error: Optional[Callable] = None):
+        self.choose_sink = choose_sink
+        self.on_error = on_error
+        self.completed = []
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+        self._sink = None
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def write(self, chunk: bytes):
+        self._parser.write(chunk)
+
+    def finalize(self):
+        self._parser.finalize()
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._sink = None
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        content_type, _ = parse_options_header(self._headers.get(b"content-type", b""))
+        filename = options.get(b"filename")
+        self._sink = self.choose_sink(
+            options.get(b"name", b"").decode(errors="replace"),
+            filename.decode(errors="replace") if filename is not None else None,
+            content_type.decode(errors="replace"),
+        )
+
+    def _guarded(self, func):
+        try:
+            return func()
+        except HTTPException as e:
+            if self.on_error is None:
+                raise
+            # Drop the rest of this part and report it in order
+            self.completed.append(self.on_error(self._sink, e))
+            self._sink = None
+
+    def _on_part_data(self, data, start, end):
+        if self._sink is not None:
+            self._guarded(lambda: self._sink.write(data[start:end]))
+
+    def _on_part_end(self):
+        if self._sink is not None:
+            self._guarded(lambda: self.completed.append(self._sink.finish()))
+            self._sink = None
+
+
+def ingest_file(fileobj, filename: Optional[str], chunk_size: int = 256 * 1024) -> IngestedUpload:
+    """Validate and buffer an image read from a file object (e.g. an archive member)."""
+    sink = ImageSink(filename)
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        sink.write(chunk)
+    return sink.finish()
+
+
+async def ingest_upload(request: Request, field_name: str = "file") -> IngestedUpload:
+    """
+    Stream a multipart/form-data body and keep only the image part.
+
+    Size, magic bytes and pixel dimensions are checked while the body is still arriving, so
+    oversized uploads and decompression bombs are rejected without buffering them first.
+    """
+    check_content_length(request, config.MAX_UPLOAD_BYTES)
+
+    boundary = multipart_boundary(request)
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    def choose_sink(name, filename, content_type):
+        # Only the first part with the expected field name is kept
+        if name == field_name and not chosen:
+            chosen.append(name)
+            return ImageSink(filename)
+        return None
+
+    chosen = []
+    reader = PartReader(boundary, choose_sink)
+    async for chunk in request.stream():
+        reader.write(chunk)
+    reader.finalize()
+
+    if not reader.completed:
+        raise HTTPException(status_code=400, detail=f"No '{field_name}' file in the upload")
+    return reader.completed[0]
+
+
+async def stream_upload(request: Request) -> IngestedUpload:
+    """FastAPI dependency for endpoints that take a single image in the 'file' field."""
+    return await ingest_upload(request)
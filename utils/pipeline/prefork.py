@@ -0,0 +1,207 @@
+"""
+Pre-fork server: load the models once, then fork the uvicorn workers.
+
+With `uvicorn main:app --workers N` every worker loads its own copy of best.pt (and MTCNN), so
+memory grows linearly with N. Here the parent imports the app, loads the PREFORK_PRELOAD models,
+freezes the heap out of the garbage collector's reach and only then forks; the workers share the
+weight pages copy-on-write and accept on one listening socket. Dead workers are re-forked from the
+still-clean parent, so a restart costs milliseconds instead of a model load.
+
+    python -m utils.pipeline.prefork --host 0.0.0.0 --port 8000 --workers 4
+    python -m utils.pipeline.prefork --report <parent pid>   # USS/PSS of the parent and each worker
+
+USS is what a worker alone holds (freed if it exits); PSS splits shared pages evenly, so the PSS
+column sums to the real footprint of the whole group.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Dict, List
+
+import psutil
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# torch's own thread count, restored in the workers after preload() pinned the parent to one
+_default_threads = 0
+
+
+def memory_usage(pid: int = None) -> dict:
+    """RSS, PSS and USS of one process in MB; PSS is Linux-only and None elsewhere."""
+    info = psutil.Process(pid).memory_full_info()
+    pss = getattr(info, "pss", None)
+    return {
+        "pid": pid or os.getpid(),
+        "rss_mb": round(info.rss / MB, 1),
+        "pss_mb": round(pss / MB, 1) if pss is not None else None,
+        "uss_mb": round(info.uss / MB, 1),
+    }
+
+
+def memory_report(parent_pid: int) -> List[dict]:
+    """memory_usage() of a pre-fork parent and each of its workers."""
+    parent = psutil.Process(parent_pid)
+    rows = []
+    for process in [parent, *parent.children()]:
+        try:
+            rows.append(memory_usage(process.pid))
+        except psutil.Error:
+            # A worker that exited (or is being restarted) since children() was read
+            continue
+    return rows
+
+
+def print_report(parent_pid: int):
+    rows = memory_report(parent_pid)
+    print(f"{'pid':>8} {'rss MB':>9} {'pss MB':>9} {'uss MB':>9}")
+    for row in rows:
+        role = "parent" if row["pid"] == parent_pid else "worker"
+        print(f"{row['pid']:>8} {row['rss_mb']:>9} {row['pss_mb']!s:>9} {row['uss_mb']:>9}  {role}")
+    if all(row["pss_mb"] is not None for row in rows):
+        print(f"{'total':>8} {'':>9} {sum(row['pss_mb'] for row in rows):>9.1f}")
+
+
+def preload():
+    """Load the PREFORK_PRELOAD models this worker role serves into the parent."""
+    global _default_threads
+    from utils.pipeline import analyzers
+
+    names = [name for name in config.PREFORK_PRELOAD if name in analyzers.ENABLED]
+    if not names:
+        return
+
+    import torch
+    # A single thread keeps torch from starting its OpenMP pool here; forked children cannot use it
+    _default_threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+
+    for name in names:
+        start = time.perf_counter()
+        if name == "objects":
+            from utils.ObjectModel import detect
+            # One model per yolo pool thread, as checkout_model() would load them
+            for _ in range(config.YOLO_POOL_SIZE):
+                model = detect.load_model()
+                # Fusing conv+bn writes new weight tensors; done here, not on each worker's first predict
+                if config.YOLO_WEIGHTS.endswith(".pt"):
+                    model.fuse()
+                detect.release_model(model)
+        elif name == "faces":
+            from utils.faceDetect import face_detection
+            face_detection.get_detector()
+        else:
+            logger.warning(f"Nothing to preload for {name}")
+            continue
+        logger.info(f"Preloaded {name} in {time.perf_counter() - start:.1f}s")
+
+
+def _run_worker(app, sock, uvicorn_config: dict):
+    """Body of a forked worker: its own event loop and uvicorn.Server on the shared socket."""
+    import uvicorn
+
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(config.PREFORK_THREADS_PER_WORKER or _default_threads or torch.get_num_threads())
+
+    server = uvicorn.Server(uvicorn.Config(app, **uvicorn_config))
+    server.run(sockets=[sock])
+
+
+def serve(host: str, port: int, workers: int):
+    import uvicorn
+
+    if config.INFERENCE_BACKEND == "process":
+        logger.warning("INFERENCE_BACKEND=process loads models in spawned pool processes, which share nothing")
+
+    from main import app
+    preload()
+
+    uvicorn_config = {"host": host, "port": port}
+    sock = uvicorn.Config(app, **uvicorn_config).bind_socket()
+
+    # Objects created so far are never collected; keeping the collector off them keeps their pages shared
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                _run_worker(app, sock, uvicorn_config)
+            except BaseException:
+                logger.exception("Worker crashed")
+                code = 1
+            finally:
+                # Skip the parent's atexit handlers and buffered state
+                os._exit(code)
+        children[pid] = slot
+        logger.info(f"Started worker {slot} (pid {pid})")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(max(1, workers)):
+        spawn(slot)
+
+    next_report = time.monotonic() + config.PREFORK_MEMORY_LOG_INTERVAL
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            slot = children.pop(pid)
+            if not stopping:
+                logger.warning(f"Worker {slot} (pid {pid}) exited with status {status}; restarting it")
+                spawn(slot)
+            continue
+
+        if config.PREFORK_MEMORY_LOG_INTERVAL and time.monotonic() >= next_report:
+            next_report = time.monotonic() + config.PREFORK_MEMORY_LOG_INTERVAL
+            for row in memory_report(os.getpid()):
+                logger.info(f"Memory pid {row['pid']}: rss {row['rss_mb']} MB, pss {row['pss_mb']} MB, "
+                            f"uss {row['uss_mb']} MB")
+        time.sleep(0.5)
+
+    sock.close()
+    logger.info("All workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=config.PREFORK_WORKERS)
+    parser.add_argument("--report", type=int, metavar="PID", help="print USS/PSS of a running pre-fork server")
+    args = parser.parse_args()
+
+    if args.report:
+        print_report(args.report)
+        return
+
+    logging.basicConfig(level=logging.INFO)
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import io
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+from config import config
+from utils.pipeline.annotate import FORMATS, _boxes
+from utils.pipeline.image_context import ImageContext
+
+MODES = ("blur", "pixelate")
+
+# Pixelation: blocks across the longer side of a region
+PIXELATE_BLOCKS = 8
+
+# EXIF orientation -> transpose that displays the pixels upright once the tag is gone
+ORIENTATION = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def regions(results: dict, width: int, height: int) -> List[tuple]:
+    """(left, top, right, bottom) of every REDACT_LABELS box in the objects and faces results, padded."""
+    found = []
+    for name in ("objects", "faces"):
+        for label, box in _boxes(results.get(name)):
+            if label not in config.REDACT_LABELS:
+                continue
+            pad_x, pad_y = box["width"] * config.REDACT_PADDING, box["height"] * config.REDACT_PADDING
+            left, top = max(0, int(box["x"] - pad_x)), max(0, int(box["y"] - pad_y))
+            right = min(width, int(box["x"] + box["width"] + pad_x + 0.5))
+            bottom = min(height, int(box["y"] + box["height"] + pad_y + 0.5))
+            if right > left and bottom > top:
+                found.append((left, top, right, bottom))
+    return found
+
+
+def obscure(roi: np.ndarray, mode: str):
+    """Blur or pixelate one region of the frame in place."""
+    import cv2
+    height, width = roi.shape[:2]
+    if mode == "pixelate":
+        block = max(1, max(width, height) // PIXELATE_BLOCKS)
+        small = cv2.resize(roi, (max(1, width // block), max(1, height // block)), interpolation=cv2.INTER_AREA)
+        roi[:] = cv2.resize(small, (width, height), interpolation=cv2.INTER_NEAREST)
+    else:
+        # A kernel about a third of the region wipes out features at any size; it must be odd
+        kernel = max(width, height) // 3 | 1
+        roi[:] = cv2.GaussianBlur(roi, (kernel, kernel), 0)
+
+
+def redact(image: ImageContext, results: dict, mode: str = "blur", fmt: str = "jpeg") -> bytes:
+    """
+    The full-resolution image with its faces and REDACT_LABELS objects obscured, encoded as JPEG or
+    WebP. The detections are the ones /api computed (and cached) for this image, so nothing is
+    detected again and the shared decode is copied once. The output carries no EXIF or other metadata.
+    """
+    # The one copy: the shared frame stays clean for the other consumers of this image
+    canvas = np.array(image.rgb_array)
+    for left, top, right, bottom in regions(results, image.width, image.height):
+        obscure(canvas[top:bottom, left:right], mode)
+
+    output = Image.fromarray(canvas)
+    # The boxes are in stored-pixel coordinates; bake the orientation in since its tag is dropped
+    if image.orientation in ORIENTATION:
+        output = output.transpose(ORIENTATION[image.orientation])
+
+    pil_format, _ = FORMATS[fmt]
+    buffer = io.BytesIO()
+    if pil_format == "WEBP":
+        output.save(buffer, pil_format, quality=config.REDACT_QUALITY, method=0)
+    else:
+        output.save(buffer, pil_format, quality=config.REDACT_QUALITY)
+    return buffer.getvalue()
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+from PIL import Image
+
+from config import config
+from utils.pipeline import analyzers, executor, inference_pool
+from utils.pipeline.image_context import ImageContext
+
+logger = logging.getLogger(__name__)
+
+# Outcome of the last warm-up, reported by /ready
+status = {"ready": False, "started": None, "finished": None, "steps": {}}
+
+
+def _sample_image() -> ImageContext:
+    """A real photo (with faces) exercises every MTCNN stage; a blank frame is the fallback."""
+    if config.WARMUP_IMAGE and os.path.exists(config.WARMUP_IMAGE):
+        with open(config.WARMUP_IMAGE, "rb") as f:
+            return ImageContext.from_bytes(f.read())
+    return ImageContext(Image.new("RGB", (640, 480), (127, 127, 127)))
+
+
+def _parallel_calls(pool_size: int) -> int:
+    # One call per worker, so every pooled model instance / worker process gets loaded
+    return max(1, config.INFERENCE_WORKERS if inference_pool.enabled() else pool_size)
+
+
+async def _warm_objects():
+    from utils.ObjectModel import detect
+    await asyncio.gather(*[detect.run_detection(_sample_image()) for _ in range(_parallel_calls(config.YOLO_POOL_SIZE))])
+
+
+async def _warm_faces():
+    from utils.faceDetect import face_detection
+    await asyncio.gather(*[
+        face_detection.process_image(_sample_image()) for _ in range(_parallel_calls(config.FACE_POOL_SIZE))
+    ])
+
+
+async def _warm_qr():
+    from utils.qr_code import qr_checker
+    await qr_checker.decode_qr(_sample_image())
+
+
+async def _warm_http():
+    client = executor.get_http_client()
+    for url in config.WARMUP_URLS:
+        try:
+            await client.head(url, timeout=5)
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not pre-connect to {url}: {str(e)}")
+
+    from utils.genai_llm import llm_response
+    await llm_response.warm_up()
+
+
+# (name, coroutine, whether the replica is unusable if it fails, analyzers that need it)
+WARMUP_STEPS = [
+    ("objects", _warm_objects, True, ("objects",)),
+    ("faces", _warm_faces, True, ("faces",)),
+    ("qr", _warm_qr, True, ("qr",)),
+    ("http", _warm_http, False, ("nsfw", "llm")),
+]
+
+
+def enabled_steps() -> list:
+    """Steps for the analyzers this worker role serves; the others' models are never loaded."""
+    return [(name, step, required) for name, step, required, needed_by in WARMUP_STEPS
+            if any(analyzer in analyzers.ENABLED for analyzer in needed_by)]
+
+
+async def _run_step(name: str, step, required: bool):
+    start = time.perf_counter()
+    try:
+        await step()
+        status["steps"][name] = {"ok": True, "ms": round((time.perf_counter() - start) * 1000, 1)}
+    except Exception as e:
+        logger.exception(f"Warm-up step {name} failed")
+        status["steps"][name] = {"ok": False, "required": required, "error": str(e)}
+
+
+async def warm_up():
+    """
+    Load the models this worker role serves, run a dummy inference through each analyzer's real code
+    path and open the outbound connection pools, then mark the process ready. Required steps must all succeed.
+    """
+    status["started"] = time.time()
+    if not config.WARMUP_ENABLED:
+        status["ready"] = True
+        status["finished"] = status["started"]
+        return
+
+    steps = enabled_steps()
+    await asyncio.gather(*[_run_step(name, step, required) for name, step, required in steps])
+
+    status["finished"] = time.time()
+    status["ready"] = all(status["steps"][name]["ok"] for name, _, required in steps if required)
+    elapsed = status["finished"] - status["started"]
+    if status["ready"]:
+        logger.info(f"Warm-up finished in {elapsed:.1f}s; ready for traffic")
+    else:
+        logger.error(f"Warm-up failed after {elapsed:.1f}s; /ready stays unavailable")
@@ -1,14 +1,21 @@
-import cv2
-from pyzbar.pyzbar import decode
 import urllib.parse
 import re
-import requests
-import tldextract
+import httpx
 import time
 import idna
 import unidecode
 from PIL import Image
 import asyncio
+from typing import Optional, Tuple
+
+from utils.cache.result_cache import Uncached
+from utils.pipeline import executor
+from utils.pipeline.image_context import ImageContext
+
+# Bump whenever the QR checks change so cached results are not reused
+ANALYZER_VERSION = "2"
+
+NO_QR_CODE = "No QR code found in image"
 
 # Known URL shortener domains
 url_shorteners = {
@@ -80,10 +87,15 @@ homoglyph_map = {
     'z': ['ѕ']
 }
 
+def extract_domain(url):
+    """tldextract loads its suffix list on import; only pay for it once a QR code holds a URL."""
+    import tldextract
+    return tldextract.extract(url)
+
 async def is_shortlink(url):
     """Check if URL is from a known URL shortener"""
     try:
-        domain = tldextract.extract(url).registered_domain
+        domain = extract_domain(url).registered_domain
         return domain in url_shorteners
     except Exception:
         return False
@@ -96,7 +108,7 @@ async def safely_resolve_url(url, max_redirects=5):
     try:
         for _ in range(max_redirects):
             redirect_chain.append(current_url)
-            head_response = requests.head(current_url, headers=headers, allow_redirects=False, timeout=5)
+            head_response = await executor.get_http_client().head(current_url, headers=headers, follow_redirects=False, timeout=5)
             
             if head_response.status_code not in [301, 302, 303, 307, 308]:
                 break
@@ -113,7 +125,7 @@ async def safely_resolve_url(url, max_redirects=5):
         
         return current_url, redirect_chain, None
     
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return None, redirect_chain, f"Error resolving URL: {str(e)}"
 
 async def contains_homoglyphs(url):
@@ -136,13 +148,23 @@ async def detect_homograph_attack(domain):
 
 async def analyze_content(content):
     """Analyze decoded content for security risks"""
+    result, _ = await assess_content(content)
+    return result
+
+async def assess_content(content) -> Tuple[dict, bool]:
+    """
+    analyze_content, plus whether the verdict rests on a live lookup (resolving a short link, whose
+    redirects change over time) or on a failure, in which case it must not be cached.
+    """
     risks = []
     risk_level = "LOW"
+    volatile = False
     
     try:
         parsed = urllib.parse.urlparse(content)
         if parsed.scheme:
             if await is_shortlink(content):
+                volatile = True
                 final_url, redirects, error = await safely_resolve_url(content)
                 
                 if error:
@@ -158,7 +180,7 @@ async def analyze_content(content):
                     content = final_url
                     risks.append(f"URL redirect chain: {' -> '.join(redirects)}")
             
-            domain_info = tldextract.extract(content)
+            domain_info = extract_domain(content)
             domain = f"{domain_info.domain}.{domain_info.suffix}"
             
             if await contains_homoglyphs(content):
@@ -190,6 +212,7 @@ async def analyze_content(content):
     except Exception as e:
         risks.append(f"Error analyzing URL: {str(e)}")
         risk_level = "UNKNOWN"
+        volatile = True
     
     return {
         "content": content,
@@ -197,7 +220,7 @@ async def analyze_content(content):
         # "risks": risks,
         "is_malicious": risk_level == "HIGH",
         # "recommendation": "BLOCK" if risk_level == "HIGH" else "WARN" if risk_level == "MEDIUM" else "ALLOW"
-    }
+    }, volatile
 
 async def analyze_redirect_chain(redirect_chain):
     """Analyze the redirect chain for suspicious patterns"""
@@ -211,7 +234,7 @@ async def analyze_redirect_chain(redirect_chain):
     if has_http and has_https:
         risks.append("Mixed HTTP/HTTPS redirects detected")
     
-    domains = [tldextract.extract(url).suffix for url in redirect_chain]
+    domains = [extract_domain(url).suffix for url in redirect_chain]
     if len(set(domains)) > 2:
         risks.append(f"Multiple country domains in redirect chain: {', '.join(set(domains))}")
     
@@ -220,20 +243,29 @@ async def analyze_redirect_chain(redirect_chain):
 async def decode_qr(image: Image):
     """Decode QR code from image"""
     try:
-        decoded_objects = decode(image)
+        # pyzbar works on luminance; the shared grayscale array saves it converting its own copy
+        from pyzbar.pyzbar import decode
+        context = ImageContext.wrap(image)
+        decoded_objects = await executor.run_blocking("qr", lambda: decode(context.gray_array))
         if not decoded_objects:
-            return None, "No QR code found in image"
+            return None, NO_QR_CODE
         return decoded_objects[0].data.decode('utf-8'), None
     except Exception as e:
         return None, f"Error decoding QR code: {str(e)}"
 
 async def check_qr_safety(image: Image):
     """Main method to check QR code safety"""
+    result, _ = await assess_qr(image)
+    return result
+
+async def assess_qr(image: Image) -> Tuple[dict, bool]:
+    """check_qr_safety, plus whether the result must not be cached (see assess_content)."""
     content, error = await decode_qr(image)
     if error:
-        return {"error": error}
+        # Finding no QR code is a property of the image; a decoder failure is not
+        return {"error": error}, error != NO_QR_CODE
     
-    return await analyze_content(content)
+    return await assess_content(content)
 
 # Example usage
 async def process_qr_scan(image: Image):
@@ -244,5 +276,13 @@ async def process_qr_scan(image: Image):
     else:
         return None
 
+async def analyze_qr(image: Image) -> Optional[dict]:
+    """
+    process_qr_scan for the analyzer pipeline: verdicts from a failure or a live short-link lookup
+    are returned but not cached, so one network error does not mark the image HIGH for good.
+    """
+    result, volatile = await assess_qr(image)
+    return Uncached(result) if volatile else result
+
 # Run with an event loop
 # Example: asyncio.run(process_qr_scan(Image.open("path/to/qr/image.png")))
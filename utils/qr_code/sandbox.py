@@ -0,0 +1,29 @@
+import importlib.util
+import os
+import threading
+
+from utils.pipeline import executor
+
+# The sandbox analyzer is a standalone script; its file name is not importable as a module
+SANDBOX_SCRIPT = os.path.join(os.path.dirname(__file__), "qr-sandbox-checker.py")
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def get_analyzer():
+    """Load QRSandboxAnalyzer on first use, so docker and selenium are only imported when needed."""
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                spec = importlib.util.spec_from_file_location("qr_sandbox_checker", SANDBOX_SCRIPT)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                _analyzer = module.QRSandboxAnalyzer()
+    return _analyzer
+
+
+async def analyze(qr_data: str) -> dict:
+    """Full container + browser analysis of QR content; takes seconds, so run it as a job."""
+    return await executor.run_blocking("sandbox", lambda: get_analyzer().analyze_in_sandbox(qr_data))
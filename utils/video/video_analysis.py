@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import os
+import tempfile
+from typing import AsyncIterator, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException, Request
+from PIL import Image
+
+from config import config
+from utils.pipeline import analyzers, executor, ingest
+from utils.pipeline.image_context import ImageContext
+
+logger = logging.getLogger(__name__)
+
+# Size of the grey thumbnail two frames are compared on
+THUMB_SIZE = (64, 36)
+# Grey-level change of a thumbnail pixel that counts as a real change rather than codec noise
+PIXEL_DELTA = 25
+
+
+def sniff_video(head: bytes) -> Optional[str]:
+    """Container format from the first bytes of the upload, or None if unsupported."""
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "mkv"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "avi"
+    return None
+
+
+class VideoSink:
+    """Receives the video part into a named temp file, which OpenCV can open by path."""
+
+    def __init__(self, filename: Optional[str]):
+        self.filename = filename
+        self.size = 0
+        self.format = None
+        self._head = bytearray()
+        self._file = tempfile.NamedTemporaryFile(delete=False)
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > config.VIDEO_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Video exceeds {config.VIDEO_MAX_BYTES} bytes")
+        if self.format is None:
+            self._head += data
+            if len(self._head) >= 12:
+                self.format = sniff_video(bytes(self._head[:12]))
+                if self.format is None:
+                    raise HTTPException(status_code=415, detail="Unsupported or invalid video format")
+                self._head = bytearray()
+        self._file.write(data)
+
+    def finish(self) -> str:
+        self._file.close()
+        if self.size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+        if self.format is None:
+            raise HTTPException(status_code=415, detail="Unsupported or invalid video format")
+        return self._file.name
+
+    def discard(self):
+        self._file.close()
+        os.unlink(self._file.name)
+
+
+async def receive_video(request: Request) -> AsyncIterator[str]:
+    """
+    FastAPI dependency: stream the 'file' part of a multipart body to a temp file and yield its
+    path; the file is deleted once the request is done.
+    """
+    ingest.check_content_length(request, config.VIDEO_MAX_BYTES)
+    boundary = ingest.multipart_boundary(request)
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    sinks = []
+
+    def choose_sink(name, filename, content_type):
+        if name == "file" and not sinks:
+            sinks.append(VideoSink(filename))
+            return sinks[0]
+        return None
+
+    reader = ingest.PartReader(boundary, choose_sink)
+    try:
+        async for chunk in request.stream():
+            reader.write(chunk)
+        reader.finalize()
+        if not reader.completed:
+            raise HTTPException(status_code=400, detail="No 'file' video in the upload")
+    except BaseException:
+        for sink in sinks:
+            sink.discard()
+        raise
+
+    try:
+        yield reader.completed[0]
+    finally:
+        os.unlink(reader.completed[0])
+
+
+class KeyframeReader:
+    """
+    Decodes a video as a stream and returns only the frames worth analysing: one every
+    1/VIDEO_SAMPLE_FPS seconds, and of those only the ones that differ from the last keyframe
+    (or come VIDEO_MAX_KEYFRAME_GAP seconds after it). Frames in between are grabbed but never
+    decoded to pixels. Not thread-safe; call it from one thread at a time.
+    """
+
+    def __init__(self, path: str):
+        import cv2
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError("Unreadable or unsupported video")
+        fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.step = max(1, round(self.fps / config.VIDEO_SAMPLE_FPS))
+        self.index = -1
+        self.sampled = 0
+        self.keyframes = 0
+        self.truncated = False
+        self.last_time = 0.0
+        self._keyframe_thumb = None
+        self._keyframe_time = None
+
+    def _changed(self, thumb: np.ndarray, time_s: float) -> bool:
+        if self._keyframe_thumb is None or time_s - self._keyframe_time >= config.VIDEO_MAX_KEYFRAME_GAP:
+            return True
+        # Compared with the last keyframe, not the previous sample, so slow drift adds up. The share of
+        # changed pixels (not the mean difference) notices a small object moving in a still scene.
+        changed = np.abs(thumb - self._keyframe_thumb) > PIXEL_DELTA
+        return float(changed.mean()) >= config.VIDEO_CHANGE_THRESHOLD
+
+    def next_keyframe(self) -> Optional[Tuple[float, np.ndarray]]:
+        """(time in seconds, RGB frame) of the next keyframe, or None at the end."""
+        import cv2
+        while True:
+            if not self.capture.grab():
+                return None
+            self.index += 1
+            time_s = self.index / self.fps
+            if time_s > config.VIDEO_MAX_SECONDS:
+                self.truncated = True
+                return None
+            self.last_time = time_s
+            if self.index % self.step:
+                continue
+
+            ok, frame = self.capture.retrieve()
+            if not ok:
+                return None
+            self.sampled += 1
+            small = cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+            thumb = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+            if not self._changed(thumb, time_s):
+                continue
+
+            if self.keyframes >= config.VIDEO_MAX_KEYFRAMES:
+                self.truncated = True
+                return None
+            self.keyframes += 1
+            self._keyframe_thumb = thumb
+            self._keyframe_time = time_s
+            return time_s, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def close(self):
+        self.capture.release()
+
+
+def _iou(a: dict, b: dict) -> float:
+    width = min(a["x"] + a["width"], b["x"] + b["width"]) - max(a["x"], b["x"])
+    height = min(a["y"] + a["height"], b["y"] + b["height"]) - max(a["y"], b["y"])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = a["width"] * a["height"] + b["width"] * b["height"] - intersection
+    return intersection / union if union else 0.0
+
+
+class IoUTracker:
+    """
+    Links the boxes of consecutive keyframes into tracks: same label, greedy best IoU of at least
+    min_iou. A track that finds no match at a keyframe ends there.
+    """
+
+    def __init__(self, min_iou: float):
+        self.min_iou = min_iou
+        self.tracks = []
+        self._active = []
+
+    def update(self, segment: int, time_s: float, detections: list):
+        boxes = [(entry["object"], box) for entry in detections for box in entry.get("coordinates", [])]
+        pairs = sorted(
+            ((_iou(track["boxes"][-1], box), t, b)
+             for t, track in enumerate(self._active) for b, (label, box) in enumerate(boxes)
+             if track["object"] == label),
+            key=lambda pair: pair[0], reverse=True,
+        )
+
+        matched = {}
+        used = set()
+        for score, t, b in pairs:
+            if score < self.min_iou:
+                break
+            if t not in used and b not in matched:
+                used.add(t)
+                matched[b] = self._active[t]
+
+        active = []
+        for b, (label, box) in enumerate(boxes):
+            track = matched.get(b)
+            if track is None:
+                track = {"id": len(self.tracks) + 1, "object": label, "start": round(time_s, 3), "boxes": []}
+                self.tracks.append(track)
+            track["boxes"].append({"time": round(time_s, 3), **box})
+            track["last_segment"] = segment
+            active.append(track)
+        self._active = active
+
+
+def _trackable(results: dict) -> list:
+    """Object and face detections of a keyframe, skipping failed or timed-out sections."""
+    detections = results.get("objects")
+    detections = list(detections) if isinstance(detections, list) else []
+    faces = results.get("faces")
+    if isinstance(faces, dict) and faces.get("coordinates"):
+        detections.append(faces)
+    return detections
+
+
+async def analyze_video(path: str, names: List[str]) -> dict:
+    """
+    Analyse the keyframes of a video with the given analyzers and link their boxes into tracks.
+    Each segment runs from one keyframe to the next and carries that keyframe's raw analyzer
+    results under "results"; boxes are carried forward over the unchanged frames in between.
+    """
+    reader = await executor.run_blocking("video", KeyframeReader, path)
+    tracker = IoUTracker(config.VIDEO_TRACK_IOU)
+    segments = []
+    pending = None
+    try:
+        pending = asyncio.ensure_future(executor.run_blocking("video", reader.next_keyframe))
+        while True:
+            keyframe = await pending
+            if keyframe is None:
+                break
+            # Decode ahead to the next keyframe while this one is being analysed
+            pending = asyncio.ensure_future(executor.run_blocking("video", reader.next_keyframe))
+
+            time_s, frame = keyframe
+            # No digest: frames are not worth caching, and near-duplicates were already skipped
+            results = await analyzers.run_analyzers(ImageContext(Image.fromarray(frame)), None, names)
+            tracker.update(len(segments), time_s, _trackable(results))
+            segments.append({"start": round(time_s, 3), "results": results})
+    finally:
+        # The reader must not be released while a decode step is still running on it
+        if pending is not None and not pending.done():
+            await asyncio.gather(pending, return_exceptions=True)
+        await executor.run_blocking("video", reader.close)
+
+    for current, following in zip(segments, segments[1:] + [None]):
+        current["end"] = following["start"] if following else round(reader.last_time, 3)
+    for track in tracker.tracks:
+        track["end"] = segments[track.pop("last_segment")]["end"]
+
+    logger.info(f"Video: {reader.index + 1} frames, {reader.sampled} sampled, {reader.keyframes} analysed")
+    return {
+        "fps": round(reader.fps, 3),
+        "duration": round(reader.last_time, 3),
+        "frames": reader.index + 1,
+        "sampled_frames": reader.sampled,
+        "analyzed_frames": reader.keyframes,
+        "truncated": reader.truncated,
+        "segments": segments,
+        "tracks": tracker.tracks,
+    }